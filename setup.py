@@ -54,14 +54,18 @@ if __name__ == "__main__":
             "numpy",
             "pandas",
             "matplotlib",
-            "torch>1.9.0",
+            "torch>=2.1.0",
             "scikit-learn",
             "datetime",
             "pyparsing>=2.2.1,<3",
             "arch",
-            "optuna",
+            "optuna>=2.0.0",
             "pmdarima",
             "statsmodels",
             "tensorboard",
         ],
+        extras_require={
+            # fused evaluation of the Gaussian NLL on the CPU
+            "numba": ["numba"],
+        },
     )
@@ -62,7 +62,7 @@ logger = create_event_logger('baselines')
 def main(infile, target_id):
     sarimax_model = None
     # Read load data
-    df = pd.read_csv(infile, sep=";", index_col=0)
+    df = dh.read_csv(infile, sep=";", index_col=0)
     df = dh.fill_if_missing(df, periodicity=SEASONALITY)
 
     df = dh.set_to_hours(df, freq=RESOLUTION)
@@ -95,9 +95,11 @@ def main(infile, target_id):
             decoder_features=None,
             target_id=PAR["target_id"],
         )
-        dl_train = dataset_train.make_data_loader(batch_size=1, shuffle=False)
-        x_train_1d = np.array([input.squeeze().numpy() for input, _, _ in dl_train])
-        y_train_1d = np.array([target.squeeze().numpy() for _, _, target in dl_train])
+        # all samples in one batch, the arrays are copied so they own their memory independent of the dataset
+        dl_train = dataset_train.make_data_loader(batch_size=None, shuffle=False)
+        inputs_train, _, targets_train = next(iter(dl_train))
+        x_train_1d = inputs_train.squeeze(dim=2).numpy().copy()
+        y_train_1d = targets_train.squeeze(dim=2).numpy().copy()
 
         dataset_val = TimeSeriesData(
             df_val,
@@ -107,9 +109,11 @@ def main(infile, target_id):
             decoder_features=None,
             target_id=PAR["target_id"],
         )
-        dl_val = dataset_val.make_data_loader(batch_size=1, shuffle=False)
-        x_val_1d = np.array([input.squeeze().numpy() for input, _, _ in dl_val])
-        y_val_1d = np.array([target.squeeze().numpy() for _, _, target in dl_val])
+        # all samples in one batch, the arrays are copied so they own their memory independent of the dataset
+        dl_val = dataset_val.make_data_loader(batch_size=None, shuffle=False)
+        inputs_val, _, targets_val = next(iter(dl_val))
+        x_val_1d = inputs_val.squeeze(dim=2).numpy().copy()
+        y_val_1d = targets_val.squeeze(dim=2).numpy().copy()
 
         mean_forecast = []
         upper_pi = []
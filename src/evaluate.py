@@ -42,7 +42,10 @@ from functools import partial
 
 MAIN_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 sys.path.append(MAIN_PATH)
-warnings.filterwarnings("ignore")
+# only silence library deprecation notices, warnings about slow paths in torch stay visible
+warnings.filterwarnings("ignore", category=DeprecationWarning, module="pandas")
+warnings.filterwarnings("ignore", category=FutureWarning, module="pandas")
+warnings.filterwarnings("ignore", category=FutureWarning, module="sklearn")
 
 from proloaf.confighandler import read_config
 from proloaf.cli import parse_basic
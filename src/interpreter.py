@@ -62,8 +62,13 @@ def create_reference(dataset: tl.TimeSeriesData, timestep, batch_size):
     num_decoder_features = len(dataset.decoder_features)
     seed(1)  # seed random number generator
 
-    features1_references_np = np.zeros(shape=(batch_size, history_horizon, num_encoder_features))
-    features2_references_np = np.zeros(shape=(batch_size, forecast_horizon, num_decoder_features))
+    # float32 from the start, so the arrays can be shared with torch without another copy
+    features1_references_np = np.zeros(
+        shape=(batch_size, history_horizon, num_encoder_features), dtype=np.float32
+    )
+    features2_references_np = np.zeros(
+        shape=(batch_size, forecast_horizon, num_decoder_features), dtype=np.float32
+    )
 
     inputs1_np = dataset[timestep][0].cpu().numpy()
     inputs2_np = dataset[timestep][1].cpu().numpy()
@@ -84,7 +89,10 @@ def create_reference(dataset: tl.TimeSeriesData, timestep, batch_size):
             noise_feature2 = np.random.default_rng().normal(mu, sigma, forecast_horizon)
             features2_references_np[j, :, x] = noise_feature2 + feature_x
 
-    return torch.Tensor(features1_references_np).to(DEVICE), torch.Tensor(features2_references_np).to(DEVICE)
+    return (
+        torch.from_numpy(features1_references_np).to(DEVICE),
+        torch.from_numpy(features2_references_np).to(DEVICE),
+    )
 
 
 def create_saliency_plot(
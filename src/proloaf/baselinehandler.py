@@ -366,10 +366,11 @@ def eval_forecast(
     
 
     """
-    forecasts = torch.tensor(forecasts)
-    true_values = torch.tensor(endog_val)
-    upper_limits = torch.tensor(upper_limits)
-    lower_limits = torch.tensor(lower_limits)
+    # shares memory with numpy arrays instead of copying them
+    forecasts = torch.as_tensor(forecasts)
+    true_values = torch.as_tensor(endog_val)
+    upper_limits = torch.as_tensor(upper_limits)
+    lower_limits = torch.as_tensor(lower_limits)
     #print(f"{upper_limits.size() = }")
     #print(f"{true_values.size() = }")
 
@@ -379,22 +380,24 @@ def eval_forecast(
     )
 
     # targets_rescaled, output_rescaled = dh.rescale_manually(..)
-    results_avg = {}
-    for metric in analyzed_metrics_avg:
-        results_avg[metric.id] = metric.from_quantiles(
-            true_values.unsqueeze(dim=2), quantile_predictions, avg_over="all"
-        )
-    results_samp = {}
-    for metric in analyzed_metrics_sample:
-        results_samp[metric.id] = metric.from_quantiles(
-            true_values.unsqueeze(dim=2), quantile_predictions, avg_over="time"
-        )
-    results_ts = {}
-    for metric in analyzed_metrics_timesteps:
-        results_ts[metric.id] = metric.from_quantiles(
-            true_values.unsqueeze(dim=2), quantile_predictions, avg_over="sample"
-        )
-        ts_length = len(results_ts[metric.id])
+    # the results are only evaluated, so there is no need to record an autograd graph
+    with torch.inference_mode():
+        results_avg = {}
+        for metric in analyzed_metrics_avg:
+            results_avg[metric.id] = metric.from_quantiles(
+                true_values.unsqueeze(dim=2), quantile_predictions, avg_over="all"
+            )
+        results_samp = {}
+        for metric in analyzed_metrics_sample:
+            results_samp[metric.id] = metric.from_quantiles(
+                true_values.unsqueeze(dim=2), quantile_predictions, avg_over="time"
+            )
+        results_ts = {}
+        for metric in analyzed_metrics_timesteps:
+            results_ts[metric.id] = metric.from_quantiles(
+                true_values.unsqueeze(dim=2), quantile_predictions, avg_over="sample"
+            )
+            ts_length = len(results_ts[metric.id])
 
     df_results = pd.DataFrame(results_ts, index=range(ts_length))
     df_sample = pd.DataFrame(results_samp)
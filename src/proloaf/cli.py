@@ -87,6 +87,8 @@ def parse_with_loss(args=sys.argv[1:]):
 
     - "--ci", Enables execution mode optimized for GitLab's CI
     - "--logname", Name of the run, displayed in Tensorboard
+    - "--amp", Enables mixed precision (bfloat16) training, short for "--precision bf16-mixed"
+    - "--precision", Numerical precision used in training, one of '32-true', 'bf16-mixed' or '16-mixed'
 
     AND (only) one of the following options:
 
@@ -118,6 +120,8 @@ def parse_with_loss(args=sys.argv[1:]):
 
         - ci : True/False (see function comment)
         - logname : A string (see function comment), '' by default
+        - amp : True/False (see function comment)
+        - precision : A string (see function comment), None by default
         - station : A string (see function comment) e.g. 'opsd' or 'gefcom2017/nh_data'
         - config : A string (see function comment), None by default
         - num_pred : An int with the number of predictions
@@ -147,6 +151,19 @@ def parse_with_loss(args=sys.argv[1:]):
         action="store",
         default="",
     )
+    parser.add_argument(
+        "--amp",
+        help="Enables mixed precision (bfloat16) training",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--precision",
+        help="Numerical precision used in training",
+        type=str,
+        choices=["32-true", "bf16-mixed", "16-mixed"],
+        default=None,
+    )
 
     # TODO this should be a required argument (also remove default below)
     ident = parser.add_mutually_exclusive_group()  # required=True)
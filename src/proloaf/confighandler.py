@@ -24,6 +24,10 @@ Enables design and modification of the RNN via config files only.
 """
 import os
 import json
+from copy import deepcopy
+
+# parsed config files by path, together with modification time and size of the file when it was read
+_CONFIG_CACHE = {}
 
 def read_config(model_name = None, config_path = None, main_path=''):
     """
@@ -46,11 +50,21 @@ def read_config(model_name = None, config_path = None, main_path=''):
     dict
         A Dictionary containing the parameters read from the config file
 
+    Notes
+    -----
+    Files are only parsed again if they were modified since they were last read.
+    Each call returns a new copy, which can be modified freely.
     """
     if config_path is None:
         config_path = os.path.join('targets',  model_name, 'config.json')
-    with open(os.path.join(main_path,config_path),'r') as input:
-        return json.load(input)
+    path = os.path.abspath(os.path.join(main_path, config_path))
+    stat = os.stat(path)
+    cached = _CONFIG_CACHE.get(path)
+    if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+        with open(path,'r') as input:
+            cached = (stat.st_mtime_ns, stat.st_size, json.load(input))
+        _CONFIG_CACHE[path] = cached
+    return deepcopy(cached[2])
 
 def write_config(config, model_name = None, config_path = None, main_path=''):
     """
@@ -74,9 +88,27 @@ def write_config(config, model_name = None, config_path = None, main_path=''):
     Returns
     -------
     None
-        json.dump() has no return value.
+
+    Notes
+    -----
+    The file is not written if it already contains the given config.
+    Otherwise it is replaced atomically, so concurrent readers never see a partially written file.
     """
     if config_path is None:
         config_path = os.path.join(main_path, 'targets',  model_name, 'config.json')
-    with open(os.path.join(main_path,config_path),'w') as output:
-        return json.dump(config, output, indent=4)
\ No newline at end of file
+    path = os.path.join(main_path,config_path)
+    serialized = json.dumps(config, indent=4)
+    try:
+        # compared in serialized form, so e.g. tuples and lists with the same entries are regarded as equal
+        if json.dumps(read_config(config_path=path), sort_keys=True) == json.dumps(
+            json.loads(serialized), sort_keys=True
+        ):
+            return None
+    except (OSError, ValueError):
+        # missing or unreadable files are simply overwritten
+        pass
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path,'w') as output:
+        output.write(serialized)
+    os.replace(temp_path, path)
+    return None
\ No newline at end of file
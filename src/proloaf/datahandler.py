@@ -37,6 +37,20 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.preprocessing import MinMaxScaler
 from proloaf.event_logging import create_event_logger
 
+try:
+    # only used as multithreaded csv parser by pandas
+    import pyarrow  # noqa: F401
+
+    _CSV_ENGINE = "pyarrow"
+except ImportError:
+    _CSV_ENGINE = "c"
+
+try:
+    # optional, polars DataFrames can be split without copying
+    import polars as pl
+except ImportError:
+    pl = None
+
 logger = create_event_logger(__name__)
 
 def load_raw_data_xlsx(files, path):
@@ -123,6 +137,92 @@ def load_raw_data_xlsx(files, path):
     return individual_files
 
 
+def read_csv(path: str, sep: str = ";", index_col: int = 0, **kwargs) -> pd.DataFrame:
+    """
+    Read a prepared csv file into a DataFrame.
+
+    The multithreaded pyarrow parser is used if pyarrow is installed, otherwise pandas' default parser.
+    Columns are returned with NumPy dtypes in both cases.
+    Training data is read with `read_csv_split` instead, which parses the file in chunks and thus always
+    uses pandas' C parser, as the pyarrow engine can not read in chunks.
+
+    Parameters
+    ----------
+    path : str
+        Path of the csv file
+    sep : str, default = ";"
+        Separator used in the file
+    index_col : int, default = 0
+        Column used as index of the DataFrame
+    **kwargs
+        Additional arguments for `pandas.read_csv`, they have to be supported by the pyarrow engine
+
+    Returns
+    -------
+    pandas.DataFrame
+        The data read from the file
+    """
+    return pd.read_csv(path, sep=sep, index_col=index_col, engine=_CSV_ENGINE, **kwargs)
+
+
+def read_csv_split(
+    path: str,
+    splits: List[float],
+    sep: str = ";",
+    index_col: int = 0,
+    chunksize: int = 200_000,
+    float_dtype=np.float32,
+) -> List[pd.DataFrame]:
+    """
+    Read a prepared csv file in chunks and split it at the specified points.
+
+    Floating point columns are converted to `float_dtype` chunk by chunk, so the complete file is never held in
+    float64, and the parts are assembled directly from the chunks instead of splitting a copy of the whole file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the csv file
+    splits : List[float]
+        Relative points at which the data should be split (e.g. [0.8,0.9]). Should be in ascending order.
+    sep : str, default = ";"
+        Separator used in the file
+    index_col : int, default = 0
+        Column used as index of the DataFrame
+    chunksize : int, default = 200000
+        Number of rows parsed at once
+    float_dtype : numpy.dtype, default = numpy.float32
+        Type of the floating point columns, None keeps the parsed type
+
+    Returns
+    -------
+    List[pandas.DataFrame]
+        List of DataFrames into which the data has been split.
+    """
+    chunks = []
+    # the pyarrow engine does not support reading in chunks
+    reader = pd.read_csv(path, sep=sep, index_col=index_col, chunksize=chunksize, engine="c")
+    for chunk in reader:
+        if float_dtype is not None:
+            float_columns = chunk.select_dtypes(include="floating").columns
+            chunk = chunk.astype({col: float_dtype for col in float_columns}, copy=False)
+        chunks.append(chunk)
+    length = sum(len(chunk) for chunk in chunks)
+    split_index = [int(length * split) for split in splits]
+    parts = []
+    for start, end in zip([0, *split_index], [*split_index, length]):
+        pieces = []
+        offset = 0
+        for chunk in chunks:
+            lower, upper = max(start - offset, 0), min(end - offset, len(chunk))
+            if lower < upper:
+                pieces.append(chunk.iloc[lower:upper])
+            offset += len(chunk)
+        parts.append(pd.concat(pieces) if pieces else chunks[0].iloc[:0])
+    del chunks
+    return parts
+
+
 def load_raw_data_csv(files: List[Dict[str, Any]], path: str):
     """
     Load data from a csv file
@@ -215,12 +315,16 @@ def add_cyclical_features(df: pd.DataFrame) -> pd.DataFrame:
 
     """
     ## source http://blog.davidkaleko.com/feature-engineering-cyclical-features.html
-    df["hour_sin"] = np.sin(df.index.hour * (2.0 * np.pi / 24))
-    df["hour_cos"] = np.cos(df.index.hour * (2.0 * np.pi / 24))
-    df["weekday_sin"] = np.sin((df.index.weekday) * (2.0 * np.pi / 7))
-    df["weekday_cos"] = np.cos((df.index.weekday) * (2.0 * np.pi / 7))
-    df["mnth_sin"] = np.sin((df.index.month - 1) * (2.0 * np.pi / 12))
-    df["mnth_cos"] = np.cos((df.index.month - 1) * (2.0 * np.pi / 12))
+    # angles are computed once on plain arrays instead of once per column on the index
+    hour = df.index.hour.to_numpy() * (2.0 * np.pi / 24)
+    weekday = df.index.weekday.to_numpy() * (2.0 * np.pi / 7)
+    month = (df.index.month.to_numpy() - 1) * (2.0 * np.pi / 12)
+    df["hour_sin"] = np.sin(hour)
+    df["hour_cos"] = np.cos(hour)
+    df["weekday_sin"] = np.sin(weekday)
+    df["weekday_cos"] = np.cos(weekday)
+    df["mnth_sin"] = np.sin(month)
+    df["mnth_cos"] = np.cos(month)
     return df
 
 
@@ -231,7 +335,8 @@ def add_onehot_features(df):
     Parameters
     ----------
     df : pandas.DataFrame
-        The DataFrame that is complemented with one-hot coded time features
+        The DataFrame that is complemented with one-hot coded time features.
+        It is modified in place, columns that already exist keep their position.
 
     Returns
     -------
@@ -240,20 +345,17 @@ def add_onehot_features(df):
 
     """
     # add one-hot encoding for Hour, Month & Weekdays
-    hours = pd.get_dummies(df.index.hour, prefix="hour").set_index(
-        df.index
-    )  # one-hot encoding of hours
-    month = pd.get_dummies(df.index.month, prefix="month").set_index(
-        df.index
-    )  # one-hot encoding of month
-    weekday = pd.get_dummies(df.index.dayofweek, prefix="weekday").set_index(
-        df.index
-    )  # one-hot encoding of weekdays
-    # df = pd.concat([df, hours, month, weekday], axis=1)
-    df[hours.columns] = hours
-    df[month.columns] = month
-    df[weekday.columns] = weekday
-    # logger.info(df.head())
+    # encoded as floats, so they do not need to be converted when creating tensors
+    onehot = pd.concat(
+        [
+            pd.get_dummies(df.index.hour, prefix="hour", dtype=np.float32),
+            pd.get_dummies(df.index.month, prefix="month", dtype=np.float32),
+            pd.get_dummies(df.index.dayofweek, prefix="weekday", dtype=np.float32),
+        ],
+        axis=1,
+    ).set_index(df.index)
+    # existing columns are overwritten in place, missing ones are appended in one step
+    df[list(onehot.columns)] = onehot
     return df
 
 
@@ -710,9 +812,11 @@ class MultiScaler(sklearn.base.TransformerMixin):
 def split(df: pd.DataFrame, splits: List[float]):
     """Splits a dataframe at the specified points.
 
+    The parts are positional slices of the input, so no data is copied. Polars DataFrames are supported as well.
+
     Parameters
     ----------
-    df: pandas.DataFrame
+    df: pandas.DataFrame or polars.DataFrame
         Dataframe to be split
     splits: List[float]
         Relative points at which the DataFrame should be split (e.g. [0.8,0.9]). Should be in ascending order.
@@ -723,5 +827,7 @@ def split(df: pd.DataFrame, splits: List[float]):
         List of DataFrames into which the input has been split.
     """
     split_index = [int(len(df) * split) for split in splits]
-    intervals = zip([None, *split_index], [*split_index, None])
-    return [df[a:b] for a, b in intervals]
+    intervals = zip([0, *split_index], [*split_index, len(df)])
+    if pl is not None and isinstance(df, pl.DataFrame):
+        return [df.slice(a, b - a) for a, b in intervals]
+    return [df.iloc[a:b] for a, b in intervals]
@@ -20,6 +20,7 @@
 """
 Provides functions for logging training results and reading and writing those logs to/from csv or tensorboard files.
 """
+from concurrent.futures import Executor
 from typing import Any, Dict, Union
 import pandas as pd
 import shutil
@@ -116,6 +117,8 @@ def add_tb_element(
     epoch_start: float,
     next_epoch: int,
     step_counter: int,
+    log_histograms: bool = True,
+    executor: Executor = None,
 ):
     """
     Add scalars using TensorBoard's SummaryWriter. Corresponds to logging the status of one epoch.
@@ -140,6 +143,11 @@ def add_tb_element(
         Number of the next epoch (or current if counting starts at 1 instead of 0)
     step_counter: int,
         Total number of optimization steps done during the training so far
+    log_histograms: bool, default = True
+        Whether to log histograms of the model parameters and their gradients.
+    executor: concurrent.futures.Executor, default = None
+        If provided the histograms are computed and written in the background using this executor.
+        Parameters are copied to the host before, so training can continue while the histograms are written.
     Returns
     -------
     SummaryWriter
@@ -151,12 +159,19 @@ def add_tb_element(
     tb.add_scalar("total_time", epoch_stop - training_start, next_epoch)
     tb.add_scalar("val_loss_steps", validation_loss, step_counter)
 
+    if not log_histograms:
+        return tb
     for name, weight in net.named_parameters():
-        tb.add_histogram(name, weight, next_epoch)
-        try:
-            tb.add_histogram(f"{name}.grad", weight.grad, next_epoch)
-        except:
+        histograms = {name: weight.detach().to("cpu", copy=True)}
+        if weight.grad is not None:
+            histograms[f"{name}.grad"] = weight.grad.detach().to("cpu", copy=True)
+        else:
             logger.debug(f"{name}.grad could not be logged to tensorboard")
+        for tag, values in histograms.items():
+            if executor is None:
+                tb.add_histogram(tag, values, next_epoch)
+            else:
+                executor.submit(tb.add_histogram, tag, values, next_epoch)
         # .add_scalar(f'{name}.grad', weight.grad, epoch + 1)
     return tb
 
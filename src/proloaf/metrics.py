@@ -25,10 +25,110 @@ import sys
 import numpy as np
 import torch
 from abc import ABC, abstractmethod
-from typing import List, Union, Literal, Optional, Iterable
+from typing import Dict, List, Tuple, Union, Literal, Optional, Iterable
 import inspect
+import warnings
+from functools import lru_cache
 from statistics import NormalDist
 
+try:
+    # optional, used for fused evaluation kernels on the CPU
+    import numba
+except ImportError:
+    numba = None
+
+
+if numba is not None:
+    # without fastmath, so the results only differ from `_nll_gauss` by the rounding of exp
+    @numba.njit(parallel=True, cache=True)
+    def _nll_gauss_elementwise(target, expected_value, log_variance):
+        out = np.empty_like(target)
+        for i in numba.prange(target.shape[0]):
+            for j in range(target.shape[1]):
+                error = target[i, j] - expected_value[i, j]
+                out[i, j] = (
+                    error * error * 0.5 * np.exp(-log_variance[i, j])
+                    + 0.5 * log_variance[i, j]
+                )
+        return out
+
+
+@lru_cache(maxsize=None)
+def _quantile_tensor(quantiles: Tuple[float, ...], device: torch.device) -> torch.Tensor:
+    """Quantiles as (1, 1, quantile) tensor, kept so they are not copied to the device on every call."""
+    # a tensor created in inference mode could not be used in training later on
+    with torch.inference_mode(False):
+        return torch.tensor([[quantiles]], device=device)
+
+
+def _script(func):
+    """Compiles a pure tensor function with TorchScript, so its elementwise operations can be fused."""
+    with warnings.catch_warnings():
+        # torch.jit.script is deprecated in recent torch versions but still supported
+        warnings.simplefilter("ignore", FutureWarning)
+        return torch.jit.script(func)
+
+
+@_script
+def _nll_gauss(
+    target: torch.Tensor, expected_value: torch.Tensor, log_variance: torch.Tensor
+) -> torch.Tensor:
+    # multiplying with the inverse variance avoids a division
+    return (target - expected_value).pow(2) * (
+        0.5 * torch.exp(-log_variance)
+    ) + 0.5 * log_variance
+
+
+@_script
+def _pinball(errors: torch.Tensor, quantiles: torch.Tensor) -> torch.Tensor:
+    return torch.sum(torch.max(quantiles * errors, (quantiles - 1) * errors), dim=2)
+
+
+@_script
+def _smoothed_pinball(
+    errors: torch.Tensor, quantiles: torch.Tensor, eps: float
+) -> torch.Tensor:
+    abs_errors = errors.abs()
+    # quadratic close to the target, to avoid discontinuous gradients
+    huber = torch.where(
+        abs_errors <= eps, errors.pow(2) / (2 * eps), abs_errors - eps / 2
+    )
+    # overestimation (error <= 0) is weighted with 1 - quantile
+    weights = torch.where(errors <= 0, 1 - quantiles, quantiles)
+    return torch.sum(weights * huber, dim=2)
+
+
+@_script
+def _crps_gauss(
+    target: torch.Tensor, mu: torch.Tensor, log_variance: torch.Tensor
+) -> torch.Tensor:
+    sig = torch.exp(log_variance * 0.5)
+    # standadized x
+    sx = (target - mu) / sig
+    # density and distribution function of the standard normal distribution
+    # with the constants 1/sqrt(2*pi), 1/sqrt(2) and 1/sqrt(pi)
+    pdf = 0.3989422804014327 * torch.exp(-0.5 * sx * sx)
+    cdf = 0.5 * (1.0 + torch.erf(sx * 0.7071067811865476))
+    return sig * (sx * (2 * cdf - 1) + 2 * pdf - 0.5641895835477563)
+
+
+@_script
+def _absolute_percentage_error(
+    target: torch.Tensor, predictions: torch.Tensor, eps: float
+) -> torch.Tensor:
+    # clamping the denominator keeps zero targets finite without masking
+    return (target - predictions).abs() / target.abs().clamp_min(eps) * 100.0
+
+
+def _use_cpu_kernel(*tensors: torch.Tensor) -> bool:
+    """Whether a numba kernel can replace the torch operations (CPU evaluation without gradients)."""
+    return numba is not None and all(
+        tensor.device.type == "cpu"
+        and tensor.dtype in (torch.float32, torch.float64)
+        and not (tensor.requires_grad and torch.is_grad_enabled())
+        for tensor in tensors
+    )
+
 
 class QuantilePrediction:
     """
@@ -480,19 +580,27 @@ class NllGauss(Metric):
         )  # target.shape = torch.Size([batchsize, horizon, # of target variables]) e.g.[64,40,1]
         assert target.shape == log_variance.shape
 
-        squared_errors = (target - expected_value) ** 2
-        if avg_over == "all":
-            return torch.mean(
-                squared_errors / (2 * log_variance.exp()) + 0.5 * log_variance
+        if avg_over in ("all", "sample", "time") and _use_cpu_kernel(
+            target, expected_value, log_variance
+        ):
+            # single fused pass without temporary tensors, gradients are not needed here
+            nll = torch.from_numpy(
+                _nll_gauss_elementwise(
+                    target.detach().to(expected_value.dtype).numpy(),
+                    expected_value.detach().numpy(),
+                    log_variance.detach().numpy(),
+                )
             )
+            if avg_over == "all":
+                return nll.mean()
+            return nll.mean(dim=0 if avg_over == "sample" else 1)
+
+        if avg_over == "all":
+            return torch.mean(_nll_gauss(target, expected_value, log_variance))
         elif avg_over == "sample":
-            return torch.mean(
-                squared_errors / (2 * log_variance.exp()) + 0.5 * log_variance, dim=0
-            )
+            return torch.mean(_nll_gauss(target, expected_value, log_variance), dim=0)
         elif avg_over == "time":
-            return torch.mean(
-                squared_errors / (2 * log_variance.exp()) + 0.5 * log_variance, dim=1
-            )
+            return torch.mean(_nll_gauss(target, expected_value, log_variance), dim=1)
         else:
             raise AttributeError(
                 f"avg_over hast to one of ('all', 'time', 'sample') but was '{avg_over}'"
@@ -591,11 +699,8 @@ class PinnballLoss(Metric):
             When 'avg_over' is set to anything but "all", "time", or "sample".
         """
 
-        errors = target - predictions
-        quantiles_tensor = torch.tensor([[quantiles]], device=predictions.device)
-        upper = quantiles_tensor * errors
-        lower = (quantiles_tensor - 1) * errors
-        loss = torch.sum(torch.max(upper, lower), dim=2)
+        quantiles_tensor = _quantile_tensor(tuple(quantiles), predictions.device)
+        loss = _pinball(target - predictions, quantiles_tensor)
         if avg_over == "time":
             return torch.mean(loss, dim=1)
         if avg_over == "sample":
@@ -707,18 +812,8 @@ class SmoothedPinnballLoss(Metric):
 
         # assert (len(predictions) == (len(quantiles) + 1))
         # quantiles = options
-        loss = SmoothedPinnballLoss._huber_metric(
-            predictions=predictions, target=target, eps=eps
-        )
-
-        mask_greater = predictions >= target
-        mask_lesser = predictions < target
-        quantiles_tensor = torch.tensor([[quantiles]], device=predictions.device)
-
-        loss[mask_greater] = ((1 - quantiles_tensor) * loss)[mask_greater]
-        loss[mask_lesser] = (quantiles_tensor * loss)[mask_lesser]
-
-        loss = torch.sum(loss, dim=2)
+        quantiles_tensor = _quantile_tensor(tuple(quantiles), predictions.device)
+        loss = _smoothed_pinball(target - predictions, quantiles_tensor, float(eps))
         if avg_over == "time":
             return torch.mean(loss, dim=1)
         if avg_over == "sample":
@@ -726,15 +821,6 @@ class SmoothedPinnballLoss(Metric):
         if avg_over == "all":
             return torch.mean(loss)
 
-    @staticmethod
-    def _huber_metric(predictions, target, eps):
-        errors = target - predictions
-        mask_in = torch.abs(errors) <= eps
-        mask_out = torch.abs(errors) > eps
-        errors[mask_in] = (errors[mask_in] ** 2) / (2 * eps)
-        errors[mask_out] = torch.abs(errors[mask_out]) - eps / 2
-        return errors
-
 
 class CRPSGauss(Metric):
     """Normalized CRPS (continuous ranked probability score) of observations x
@@ -859,16 +945,7 @@ class CRPSGauss(Metric):
             raise NotImplementedError(
                 "crps_gaussian does not support loss over the horizon or per sample."
             )
-        sig = torch.exp(log_variance * 0.5)
-        norm_dist = torch.distributions.normal.Normal(0, 1)
-        # standadized x
-        sx = (target - mu) / sig
-        pdf = torch.exp(norm_dist.log_prob(sx))
-        cdf = norm_dist.cdf(sx)
-        pi_inv = 1.0 / np.sqrt(np.pi)
-        # the actual crps
-        crps = sig * (sx * (2 * cdf - 1) + 2 * pdf - pi_inv)
-        return torch.mean(crps)
+        return torch.mean(_crps_gauss(target, mu, log_variance))
 
 
 class Residuals(Metric):
@@ -1404,15 +1481,12 @@ class Mase(Metric):
 
         y_hat_test = predictions[:, :, 0]
         if insample_target is None:
-            y_hat_naive = torch.roll(
-                target, freq, 1
-            )  # shift all values by frequency, so that at time t,
-        # y_hat_naive returns the value of insample [t-freq], as the first values are 0-freq = negative,
-        # all values at the beginning are filled with values of the end of the tensor. So to not falsify the evaluation,
-        # exclude all terms before freq
+            # at time t the naive forecast is the value at [t-freq], so the terms before freq are excluded.
+            # slicing the target avoids shifting a copy of it
+            y_hat_naive = target[:, : target.shape[1] - freq]
         else:
-            y_hat_naive = insample_target
-        masep = torch.mean(torch.abs(target[:, freq:] - y_hat_naive[:, freq:]))
+            y_hat_naive = insample_target[:, freq:]
+        masep = torch.mean(torch.abs(target[:, freq:] - y_hat_naive))
         # denominator is the mean absolute error of the "seasonal naive forecast method"
         return torch.mean(torch.abs(target[:, freq:] - y_hat_test[:, freq:])) / masep
 
@@ -1616,28 +1690,15 @@ class Picp(Metric):
 
         y_pred_upper = predictions[:, :, 0]
         y_pred_lower = predictions[:, :, 1]
-        # TODO test if this can be done with torch.mean (conversion to float might not work)
-        # in_interval = (target > y_pred_lower) & (target <= y_pred_upper)
-
-        coverage_horizon = (
-            100.0
-            * (torch.sum((target > y_pred_lower) & (target <= y_pred_upper), dim=0))
-            / target.shape[0]
-        )
+        in_interval = (target > y_pred_lower) & (target <= y_pred_upper)
 
-        coverage_time = (
-                100.0
-                * (torch.sum((target > y_pred_lower) & (target <= y_pred_upper), dim=1))
-                / target.shape[1]
-        )
-
-        coverage_total = torch.sum(coverage_horizon) / target.shape[1]
+        # hits are counted as integers, only along the requested axis
         if avg_over == "all":
-            return coverage_total
+            return 100.0 * torch.count_nonzero(in_interval) / in_interval.numel()
         elif avg_over == "sample":
-            return coverage_horizon
+            return 100.0 * torch.count_nonzero(in_interval, dim=0) / target.shape[0]
         elif avg_over == "time":
-            return coverage_time
+            return 100.0 * torch.count_nonzero(in_interval, dim=1) / target.shape[1]
 
 
 class PicpLoss(Picp):
@@ -1752,36 +1813,22 @@ class Mis(Metric):
         y_pred_upper = predictions[:, :, 0]
         y_pred_lower = predictions[:, :, 1]
         target = target.squeeze(dim=2)
-        mis_horizon = torch.zeros(target.shape[1])
-        mis_sample = torch.zeros(target.shape[0])
-
-        # calculate penalty for large prediction interval
-        large_PI_penalty = torch.sum(y_pred_upper - y_pred_lower, dim=0)
-        large_PI_penalty_sample = torch.sum(y_pred_upper - y_pred_lower, dim=1)
-
-        # calculate under estimation penalty
-        diff_lower = y_pred_lower - target
-        diff_lower[diff_lower < 0] = 0
-        under_est_penalty_horizon = (2 / alpha) * torch.sum(diff_lower, dim=0)
-        under_est_penalty_sample = (2 / alpha) * torch.sum(diff_lower, dim=1)
-
-        # calculate over estimation penalty
-        diff_upper = target - y_pred_upper
-        diff_upper[diff_upper < 0] = 0
-        over_est_penalty_horizon = (2 / alpha) * torch.sum(diff_upper, dim=0)
-        over_est_penalty_sample = (2 / alpha) * torch.sum(diff_upper, dim=1)
-
-        # combine all the penalties
-        mis_horizon = (large_PI_penalty + under_est_penalty_horizon + over_est_penalty_horizon) / target.shape[0]
-        mis_sample = (large_PI_penalty_sample + under_est_penalty_sample + over_est_penalty_sample) / target.shape[1]
-        mis_total = torch.sum(mis_horizon) / target.shape[1]
 
+        # calculate under and over estimation penalty
+        diff_lower = torch.clamp_min(y_pred_lower - target, 0.0)
+        diff_upper = torch.clamp_min(target - y_pred_upper, 0.0)
+
+        # combine the penalty for large prediction intervals with the estimation penalties,
+        # only the requested average is reduced
+        interval_score = (y_pred_upper - y_pred_lower) + (2 / alpha) * (
+            diff_lower + diff_upper
+        )
         if avg_over == "all":
-            return mis_total
+            return torch.mean(interval_score)
         elif avg_over == "sample":
-            return mis_horizon
+            return torch.mean(interval_score, dim=0)
         elif avg_over == "time":
-            return mis_sample
+            return torch.mean(interval_score, dim=1)
 
 
 class Rae(Metric):
@@ -1959,6 +2006,199 @@ class Mae(Metric):
         return torch.mean(torch.abs(target - y_hat_test))
 
 
+class Mape(Metric):
+    """Calculates the MAPE (mean absolute percentage error). Lower is better.
+
+    Parameters
+    ----------
+    eps : float, default = 1e-8
+        Lower bound for the absolute value of the target in the denominator, so targets that are zero
+        lead to large but finite errors instead of infinity.
+    """
+    def __init__(self, eps: float = 1e-8):
+        super().__init__(eps=eps)
+        self.input_labels = ["expected_value"]
+
+    def from_quantiles(
+        self,
+        target: torch.tensor,
+        quantile_prediction: QuantilePrediction,
+        avg_over: Union[Literal["time"], Literal["sample"], Literal["all"]] = "all",
+        **_,
+    ):
+        """
+        Calculates the value of the metric based on interval and expectation value over the timeframe.
+
+        Parameters
+        ----------
+        target: torch.tensor
+            Target values from the training or validation dataset. Dimensions have to be (sample number, timestep, 1).
+        quantile_prediction: QuantilePrediction
+            A prediction for several quantiles. Has to contain atleast the median prediction.
+            The mean is estimated to be the median as it would be for a gaussian distribution.
+        avg_over: str
+            One of "time", "sample", "all", averages the the results over the coresponding axis.
+
+        Returns
+        -------
+        torch.tensor
+            Value of the metric, which depending on the value of 'avg_over'
+            is either a 0d-tensor (overall loss) or 1d-tensor over the horizon or the sample.
+        """
+        return self(
+            target, quantile_prediction.get_gauss_params()[:, :, 0:1], avg_over=avg_over
+        )
+
+    @staticmethod
+    def func(
+        target: torch.tensor,
+        predictions: torch.tensor,
+        avg_over: Union[Literal["time"], Literal["sample"], Literal["all"]] = "all",
+        eps: float = 1e-8,
+        **_,
+    ):
+        """
+        Calculates the MAPE (mean absolute percentage error) in percent.
+
+        Parameters
+        ----------
+        target : torch.tensor
+            true values of the target variable
+        predictions :  torch.tensor
+            Predicted values over samples and time. Dimension have to be (sample number, timestep,1).
+        avg_over: str, default = "all"
+            One of "time", "sample", "all", averages the the results over the coresponding axis.
+        eps : float, default = 1e-8
+            Lower bound for the absolute value of the target in the denominator.
+
+        Returns
+        -------
+        torch.tensor
+            The MAPE, which depending on the value of 'avg_over'
+            is either a 0d-tensor (overall loss) or 1d-tensor over the horizon or the sample.
+
+        Raises
+        ------
+        AttributeError
+            When 'avg_over' is set to anything but "all", "time" or "sample"
+        """
+        percentage_error = _absolute_percentage_error(
+            target.squeeze(dim=2), predictions.squeeze(dim=2), eps
+        )
+        if avg_over == "all":
+            return torch.mean(percentage_error)
+        elif avg_over == "sample":
+            return torch.mean(percentage_error, dim=0)
+        elif avg_over == "time":
+            return torch.mean(percentage_error, dim=1)
+        else:
+            raise AttributeError(
+                f"avg_over hast to one of ('all', 'time', 'sample') but was '{avg_over}'"
+            )
+
+
+# metrics on the error of the expected value, `evaluate_metrics` calculates them together
+_POINTWISE_ERROR_METRICS = (Residuals, Mae, Mse, Rmse, Rae)
+
+
+def pointwise_error_metrics(
+    target: torch.tensor,
+    expected_value: torch.tensor,
+    avg_over: Union[Literal["time"], Literal["sample"], Literal["all"]] = "all",
+) -> Dict[str, torch.tensor]:
+    """
+    Calculates residuals, MAE, MSE, RMSE and RAE with a single reduction over the errors.
+
+    Parameters
+    ----------
+    target : torch.tensor
+        The true values of the target variable, dimensions are (sample number, timestep, 1).
+    expected_value : torch.tensor
+        Predicted expected values of the target variable, dimensions are (sample number, timestep).
+    avg_over: str, default = "all"
+        One of "time", "sample", "all", averages the the results over the coresponding axis.
+
+    Returns
+    -------
+    Dict[str, torch.tensor]
+        Values of the metrics by their id, which depending on the value of 'avg_over'
+        are either 0d-tensors or 1d-tensors over the horizon or the sample.
+    """
+    target = target.squeeze(dim=2)
+    error = target - expected_value
+    stacked = torch.stack(
+        (error, error.abs(), error.square(), (target - target.mean()).abs())
+    )
+    if avg_over == "all":
+        means = stacked.mean(dim=(1, 2))
+    elif avg_over == "sample":
+        means = stacked.mean(dim=1)
+    elif avg_over == "time":
+        means = stacked.mean(dim=2)
+    else:
+        raise AttributeError(
+            f"avg_over hast to one of ('all', 'time', 'sample') but was '{avg_over}'"
+        )
+    residuals, absolute_error, squared_error, naive_absolute_error = means.unbind(0)
+    return {
+        "Residuals": residuals,
+        "Mae": absolute_error,
+        "Mse": squared_error,
+        "Rmse": squared_error.sqrt(),
+        "Rae": absolute_error / naive_absolute_error,
+    }
+
+
+@torch.inference_mode()
+def evaluate_metrics(
+    target: torch.tensor,
+    quantile_prediction: QuantilePrediction,
+    metrics: Iterable[Metric],
+    avg_over: Union[Literal["time"], Literal["sample"], Literal["all"]] = "all",
+) -> List[torch.tensor]:
+    """
+    Calculates several metrics on the same prediction.
+    Metrics on the error of the expected value are calculated together, so the errors are only computed once.
+    The metrics are evaluated in inference mode, so no autograd graph is recorded even if the prediction requires grad.
+
+    Parameters
+    ----------
+    target: torch.tensor
+        Target values from the training or validation dataset. Dimensions have to be (sample number, timestep, 1).
+    quantile_prediction: QuantilePrediction
+        A prediction for several quantiles, see `Metric.from_quantiles` for the requirements of each metric.
+    metrics: Iterable[Metric]
+        The metrics to be calculated.
+    avg_over: str, default = "all"
+        One of "time", "sample", "all", averages the the results over the coresponding axis.
+
+    Returns
+    -------
+    List[torch.tensor]
+        Values of the metrics in the given order.
+    """
+    metrics = list(metrics)
+    # MAE is only defined as overall average
+    fused = [
+        type(metric) in _POINTWISE_ERROR_METRICS
+        and not (isinstance(metric, Mae) and avg_over != "all")
+        for metric in metrics
+    ]
+    fused_values = {}
+    if any(fused):
+        fused_values = pointwise_error_metrics(
+            target, quantile_prediction.get_gauss_params()[:, :, 0], avg_over=avg_over
+        )
+    return [
+        fused_values[metric.id]
+        if is_fused
+        else metric.from_quantiles(
+            target=target, quantile_prediction=quantile_prediction, avg_over=avg_over
+        )
+        for metric, is_fused in zip(metrics, fused)
+    ]
+
+
 _EXCLUDED = ["Metric", "QuantilePrediction"]
 # dict {class_name:class}
 _all_dict = {
@@ -1971,48 +2211,3 @@ _all_dict = {
 def get_metric(metric_name: str, **options) -> Metric:
     cls = _all_dict[metric_name.lower()]
     return cls(**options)
-
-
-# TODO remove after baselines is up to date.
-# def results_table(models: Union[None, List[str]], results, save_to_disc: bool = False):
-#     """
-#     Put the models' scores for the given metrics in a DataFrame.
-
-#     Parameters
-#     ----------
-#     TODO: update only for the case that results includes the metrics
-#     models : List[str] or None
-#         The names of the models to use as index e.g. "gc17ct_GRU_gnll_test_hp"
-#     mse : ndarray
-#         The value(s) for mean squared error
-#     rmse : ndarray
-#         The value(s) for root mean squared error
-#     mase : ndarray
-#         The value(s) for mean absolute squared error
-#     rae : ndarray
-#         The value(s) for relative absolute error
-#     mae : ndarray
-#         The value(s) for mean absolute error
-#     sharpness : ndarray
-#         The value(s) for sharpness
-#     coverage : ndarray
-#         The value(s) for PICP (prediction interval coverage probability or % of true
-#         values in the predicted intervals)
-#     mis : ndarray
-#         The value(s) for mean interval score
-#     quantile_score : ndarray
-#         The value(s) for quantile score
-#     save_to_disc : string, default = False
-#         If not False, save the scores as a csv, to the path specified in the string
-
-#     Returns
-#     -------
-#     pandas.DataFrame
-#         A DataFrame containing the models' scores for the given metrics
-#     """
-#     results.index = [models]
-#     if save_to_disc:
-#         save_path = save_to_disc + models.replace("/", "_")
-#         results.to_csv(save_path + ".csv", sep=";", index=True)
-
-#     return results
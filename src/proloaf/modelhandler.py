@@ -26,9 +26,12 @@ from __future__ import annotations
 import numpy as np
 import pandas as pd
 import sklearn
+import datetime
+import inspect
+import io
 import os
+import sqlite3
 import sys
-import tempfile
 import optuna
 import torch
 from typing import Any, Callable, Union, List, Dict, Literal
@@ -36,6 +39,8 @@ from copy import deepcopy
 
 import proloaf
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from time import perf_counter
 from proloaf import models
 from proloaf import metrics
@@ -46,8 +51,39 @@ from proloaf.loghandler import (
 )
 from proloaf.event_logging import create_event_logger
 
+try:
+    # optional, used to compress saved models
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# first bytes of every zstandard frame, used to recognize compressed model files
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
 logger = create_event_logger(__name__)
 
+# dtypes used in autocast for the available training precisions
+_AUTOCAST_DTYPES = {
+    "32-true": None,
+    "bf16-mixed": torch.bfloat16,
+    "16-mixed": torch.float16,
+}
+
+
+def _is_distributed() -> bool:
+    return torch.distributed.is_available() and torch.distributed.is_initialized()
+
+
+def _sqlite_storage(url: str) -> optuna.storages.RDBStorage:
+    """Storage for a sqlite database that is shared by multiple processes."""
+    # with write-ahead logging readers do not block the writer, the mode is kept in the database file
+    with closing(sqlite3.connect(url[len("sqlite:///") :], timeout=60)) as connection:
+        connection.execute("PRAGMA journal_mode=WAL")
+    # wait for locks held by other processes instead of failing right away
+    return optuna.storages.RDBStorage(
+        url, engine_kwargs={"connect_args": {"timeout": 60}}
+    )
+
 
 class EarlyStopping:
     """
@@ -75,7 +111,7 @@ class EarlyStopping:
         self.early_stop = False
         self.val_loss_min = np.inf
         self.delta = delta
-        self.temp_dir = ""
+        self.best_state = None
 
     def __call__(self, val_loss: float, model):
 
@@ -96,7 +132,7 @@ class EarlyStopping:
 
     def save_checkpoint(self, val_loss: float, model):
         """
-        Save model when validation loss decreases
+        Keep a copy of the model parameters in host memory when validation loss decreases
 
         Parameters
         ----------
@@ -109,10 +145,10 @@ class EarlyStopping:
             logger.info(
                 f"Validation loss decreased ({self.val_loss_min:.6f} --> {val_loss:.6f}).  Saving model ..."
             )
-        temp_dir = tempfile.mktemp()
-        torch.save(model.state_dict(), temp_dir + "checkpoint.pt")
+        self.best_state = {
+            key: val.detach().cpu().clone() for key, val in model.state_dict().items()
+        }
         self.val_loss_min = val_loss
-        self.temp_dir = temp_dir
 
 
 class ModelWrapper:
@@ -413,8 +449,15 @@ class ModelWrapper:
                 core_layers=model_parameters.get("core_layers"),
             )
 
-        for param in self.model.parameters():
-            torch.nn.init.uniform_(param.data, -0.08, 0.08)
+        # draw all initial values at once instead of once per parameter tensor
+        with torch.no_grad():
+            params = list(self.model.parameters())
+            numels = [param.numel() for param in params]
+            values = torch.empty(sum(numels), device=params[0].device).uniform_(
+                -0.08, 0.08
+            )
+            for param, value in zip(params, values.split(numels)):
+                param.copy_(value.view_as(param))
         self.initialzed = True
         return self
 
@@ -437,6 +480,13 @@ class ModelWrapper:
         trial_id=None,
         log_tb=None,
         batch_size: int = None,
+        precision: str = "32-true",
+        validation_batch_size: int = None,
+        log_graph: bool = True,
+        compile_model: bool = False,
+        cuda_graph: bool = False,
+        num_workers: int = 0,
+        trial: optuna.trial.Trial = None,
     ):
         """
         Train the wrapped model using the given parameters specified in the ModelWrapper.
@@ -452,6 +502,22 @@ class ModelWrapper:
             If specied this TensorBoard SummaryWriter will be used for logging during the training
         trial_id : Any , default = None
             Identifier for a specific training run. Will be consecutive number if not specified
+        batch_size: int, default = None
+            Number of samples per batch during training
+        precision: str, default = "32-true"
+            Numerical precision used in training, one of "32-true", "bf16-mixed" or "16-mixed" (see `TrainingRun`).
+        validation_batch_size: int, default = None
+            Number of samples per batch during validation, defaults to four times the batch size.
+        log_graph: bool, default = True
+            Whether to add the graph of the model to the TensorBoard log.
+        compile_model: bool, default = False
+            Whether to compile the model with `torch.compile` when training on CUDA devices.
+        cuda_graph: bool, default = False
+            Whether to replay the optimization step as a CUDA graph, for models that are not compiled (see `TrainingRun`).
+        num_workers: int, default = 0
+            Number of worker processes used to load batches.
+        trial: optuna.trial.Trial, default = None
+            Trial of a hyperparameter search, the validation loss is reported to it after each epoch.
         Returns
         -------
         self
@@ -473,6 +539,13 @@ class ModelWrapper:
             history_horizon=self.history_horizon,
             log_tb=log_tb,
             device=self._device,
+            precision=precision,
+            validation_batch_size=validation_batch_size,
+            log_graph=log_graph,
+            compile_model=compile_model,
+            cuda_graph=cuda_graph,
+            num_workers=num_workers,
+            trial=trial,
         )
         training_run.train()
         values = {
@@ -501,13 +574,25 @@ class ModelWrapper:
         -------
         torch.Tensor
             Results of the prediction, 3D-Tensor of shape (batch_size, timesteps, predicted features)
+
+        Raises
+        ------
+        TypeError
+            If the inputs are not floating point, e.g. quantized features that have not been converted back
+            (see `proloaf.tensorloader.TimeSeriesData.dequantize`).
         """
         if not self.initialzed:
             raise RuntimeError(
                 "The model has not been initialized. Use .init_model() to do that"
             )
+        if not (inputs_enc.is_floating_point() and inputs_dec.is_floating_point()):
+            raise TypeError(
+                f"inputs have to be floating point but were {inputs_enc.dtype} and {inputs_dec.dtype}"
+            )
         self.to(inputs_enc.device)
-        val, _ = self.model(inputs_enc, inputs_dec)
+        # inputs might be stored in lower precision for mixed precision training
+        dtype = next(self.model.parameters()).dtype
+        val, _ = self.model(inputs_enc.to(dtype), inputs_dec.to(dtype))
         return val
 
 
@@ -536,6 +621,8 @@ class ModelHandler:
         Keyword arguments that are provided to the metric during its initialization. Depends on the chosen loss.
     device: Union[str,int], default = "cpu"
         Device on which the model should be trained. Values are equivalent to the ones used in PyTorch.
+    precision: str, default = "32-true"
+        Numerical precision used in training, one of "32-true", "bf16-mixed" or "16-mixed" (see `TrainingRun`).
 
     Notes
     -----
@@ -551,6 +638,7 @@ class ModelHandler:
         loss: str = "nllgauss",
         loss_kwargs: dict = {},
         device: str = "cpu",
+        precision: str = "32-true",
     ):
         self.work_dir = (
             work_dir
@@ -559,6 +647,7 @@ class ModelHandler:
         )
         self.config = deepcopy(config)
         self.tuning_config = deepcopy(tuning_config)
+        self.precision = precision
 
         self._model_wrap: ModelWrapper = ModelWrapper(
             name=config.get("model_name"),
@@ -640,6 +729,13 @@ class ModelHandler:
         - Possible hyperparameters are: target_id, encoder_features, decoder_features,
           optimizer_name, early_stopping_patience,early_stopping_margin,learning_rate
           max_epochs,model_class,forecast_horizon, batch_size, and every model_parameters
+        - Trials can be run in parallel processes by setting 'n_workers' in the tuning config.
+          The processes share the study through the database given as 'storage'
+          (defaults to a sqlite file in the log directory).
+          Each process receives a pickled copy of the ModelHandler and of both datasets,
+          so the memory needed for the data grows with the number of workers.
+        - A study in a storage is only resumed if 'study_name' is set in the tuning config.
+          Otherwise every run creates a new study, named after the model and the time the run started.
 
         Parameters
         ----------
@@ -657,36 +753,63 @@ class ModelHandler:
                 self.tuning_config["number_of_tests"]
             )
         )
-        study = self.make_study()
-        study.optimize(
-            self.tuning_objective(
-                self.tuning_config["settings"],
-                train_data=train_data,
-                validation_data=validation_data,
-            ),
-            n_trials=self.tuning_config["number_of_tests"],
-            timeout=self.tuning_config.get("timeout", None),
+        log_dir = os.path.join(self.work_dir, self.config["log_path"])
+        os.makedirs(log_dir, exist_ok=True)
+
+        n_workers = int(self.tuning_config.get("n_workers", 1))
+        storage = self.tuning_config.get("storage")
+        if n_workers > 1 and storage is None:
+            # independent processes can only share a study through a database
+            storage = "sqlite:///" + os.path.join(
+                log_dir, f"tuning_{self.model_wrap.name}.db"
+            )
+        study_name = self.tuning_config.get("study_name")
+        if study_name is None:
+            # a new study per run, so trials of earlier runs (possibly on other data) are not mixed in
+            started = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+            study_name = f"tuning_{self.model_wrap.name}_{started}"
+        # trained models can not be stored as attributes of trials in a database,
+        # the trial numbers are only unique within a study
+        model_dir = (
+            os.path.join(log_dir, f"tuning-models_{study_name}")
+            if storage is not None
+            else None
         )
 
+        study = self.make_study(storage=storage, study_name=study_name)
+        if n_workers > 1:
+            logger.info(f"Running hyperparameter tuning in {n_workers} processes")
+            torch.multiprocessing.spawn(
+                _tuning_worker,
+                args=(
+                    self,
+                    train_data,
+                    validation_data,
+                    storage,
+                    study_name,
+                    model_dir,
+                    self.tuning_config["number_of_tests"],
+                    n_workers,
+                    self.tuning_config.get("timeout", None),
+                ),
+                nprocs=n_workers,
+            )
+        else:
+            study.optimize(
+                self.tuning_objective(
+                    self.tuning_config["settings"],
+                    train_data=train_data,
+                    validation_data=validation_data,
+                    model_dir=model_dir,
+                ),
+                n_trials=self.tuning_config["number_of_tests"],
+                timeout=self.tuning_config.get("timeout", None),
+            )
+
         logger.info("Number of finished trials: {!s}".format(len(study.trials)))
         trials_df = study.trials_dataframe()
-
-        if not os.path.exists(os.path.join(self.work_dir, self.config["log_path"])):
-            os.mkdir(os.path.join(self.work_dir, self.config["log_path"]))
-        if not os.path.exists(os.path.join(self.work_dir, self.config["log_path"])):
-            os.mkdir(
-                os.path.join(
-                    self.work_dir,
-                    self.config["log_path"],
-                    f"tuning-results_{self.model_wrap.name}",
-                )
-            )
         trials_df.to_csv(
-            os.path.join(
-                self.work_dir,
-                self.config["log_path"],
-                f"tuning-results_{self.model_wrap.name}",
-            ),
+            os.path.join(log_dir, f"tuning-results_{self.model_wrap.name}"),
             index=False,
         )
 
@@ -704,7 +827,12 @@ class ModelHandler:
             logger.info("    {}: {}".format(key, value))
 
         self.config.update(trial.params)
-        self.model_wrap = trial.user_attrs["wrapped_model"]
+        if "model_path" in trial.user_attrs:
+            self.model_wrap = self.load_model(
+                trial.user_attrs["model_path"], locate="cpu"
+            )
+        else:
+            self.model_wrap = trial.user_attrs["wrapped_model"]
         return self
 
     def select_model(
@@ -712,6 +840,7 @@ class ModelHandler:
         data: proloaf.tensorloader.TimeSeriesData,
         models: List[ModelWrapper],
         loss: metrics.Metric,
+        performances: List[float] = None,
     ):
         """Select the best model from a list of models.
 
@@ -723,15 +852,24 @@ class ModelHandler:
             List of models from which the best is selected
         loss: proloaf.metrics.Metric
             Loss metric used as perfomance criterion
+        performances: List[float], default = None
+            Already known performance of each model on the data, measured with the given loss averaged over all samples.
+            The models are only benchmarked if this is not provided.
 
         Returns
         -------
         ModelWrapper
             The most performant model
         """
-        perf_df = self.benchmark(data, models, [loss], avg_over="all")
-        logger.info(f"Performance was:\n {perf_df}")
-        idx = perf_df.iloc[0].to_numpy().argmin()
+        if performances is None:
+            performances = (
+                self.benchmark(data, models, [loss], avg_over="all").iloc[0].to_numpy()
+            )
+        logger.info(
+            "Performance was:\n "
+            + "\n ".join(f"{model.name}: {perf}" for model, perf in zip(models, performances))
+        )
+        idx = int(np.argmin(performances))
         self.model_wrap = models[idx]
         logger.info(f"selected {self.model_wrap.name}")
         return self.model_wrap
@@ -765,44 +903,41 @@ class ModelHandler:
             Perfromances of the models
         """
 
-        with torch.no_grad():
-            bench = {}
+        # Dataloader is setup to be only one batch
+        # the batch is created outside of inference mode, as the data might be used for training later on
+        dataloader = data.make_data_loader(batch_size=None, shuffle=False)
+        inputs_enc, inputs_dec, targets = next(iter(dataloader))
+        for model in models:
+            model.to(inputs_enc.device)
+        # columns are collected by (model, metric) and the frame is built once at the end
+        columns = []
+        results = []
+        names = set()
+        with torch.inference_mode():
             for model in models:
-                # Dataloader is setup to be only one batch
-                dataloader = data.make_data_loader(batch_size=None, shuffle=False)
                 logger.info(f"benchmarking {model.name}")
-                inputs_enc, inputs_dec, targets = next(iter(dataloader))
                 quantiles = model.loss_metric.get_quantile_prediction(
                     predictions=model.predict(inputs_enc, inputs_dec),
                     target=targets,
                 )
-
-                performance = np.array(
-                    [
-                        metric.from_quantiles(
-                            target=targets,
-                            quantile_prediction=quantiles,
-                            avg_over=avg_over,
-                        )
-                        .cpu()
-                        .numpy()
-                        for metric in test_metrics
-                    ]
-                )
-                if len(performance.shape) == 1:
-                    performance = performance[np.newaxis, ...]
-                else:
-                    performance = performance.T
-                df = pd.DataFrame(
-                    data=performance, columns=[met.id for met in test_metrics]
-                )
                 name = model.name
                 i = 1
-                while name in bench:
+                while name in names:
                     name = model.name + f"({i})"
                     i = i + 1
-                bench[name] = df
-        return pd.concat(bench.values(), keys=bench.keys(), axis=1)
+                names.add(name)
+                for met, value in zip(
+                    test_metrics,
+                    metrics.evaluate_metrics(
+                        targets, quantiles, test_metrics, avg_over=avg_over
+                    ),
+                ):
+                    columns.append((name, met.id))
+                    results.append(value.reshape(-1))
+            # a single transfer to the host for all results
+            values = torch.cat(results).cpu().numpy()
+        splits = np.cumsum([result.numel() for result in results])[:-1]
+        return pd.DataFrame(dict(zip(columns, np.split(values, splits))))
 
     def run_training(
         self,  # Maybe use the datahandler as "data" which than provides all the data_loaders,for unifying the interface.
@@ -810,6 +945,7 @@ class ModelHandler:
         validation_data: proloaf.tensorloader.TimeSeriesData,
         trial_id=None,
         hparams={},
+        trial: optuna.trial.Trial = None,
     ):
         """
         Train the internal model using the given data.
@@ -824,11 +960,18 @@ class ModelHandler:
             Parameter updates for model and training
         trial_id : Any , default = None
             Identifier for a specific training run. Will be consecutive number if not specified
+        trial : optuna.trial.Trial, default = None
+            Trial of a hyperparameter search, the validation loss is reported to it after each epoch.
 
         Returns
         -------
         ModelWrapper
             The trained model
+
+        Raises
+        ------
+        optuna.exceptions.TrialPruned
+            If the trial was pruned during training
         """
         # to track the validation loss as the model trains
 
@@ -849,9 +992,27 @@ class ModelHandler:
             exploration=self.config["exploration"],
             trial_id=trial_id,
         )
-        temp_model_wrap.run_training(
-            train_data, validation_data, trial_id, tb, config.get("batch_size")
-        )
+        try:
+            temp_model_wrap.run_training(
+                train_data,
+                validation_data,
+                trial_id,
+                tb,
+                config.get("batch_size"),
+                precision=self.precision,
+                validation_batch_size=config.get("validation_batch_size"),
+                # tracing the model takes time and the graph is the same for all trials
+                log_graph=not (
+                    self.config.get("exploration", False) and isinstance(trial_id, int)
+                ),
+                compile_model=config.get("compile", False),
+                cuda_graph=config.get("cuda_graph", False),
+                num_workers=config.get("num_workers", 0),
+                trial=trial,
+            )
+        except optuna.exceptions.TrialPruned:
+            tb.close()
+            raise
 
         values = {
             "hparam/hp_total_time": temp_model_wrap.last_training.training_end_time
@@ -928,10 +1089,23 @@ class ModelHandler:
         Parameters
         ----------
         path: str
-            path to the saved model
+            path to the saved model, files compressed with zstandard are decompressed automatically
 
         """
-        inst = torch.load(path,  map_location=torch.device(locate))
+        with open(path, "rb") as model_file:
+            compressed = model_file.read(len(_ZSTD_MAGIC)) == _ZSTD_MAGIC
+        if compressed:
+            if zstandard is None:
+                raise RuntimeError(
+                    f"'{path}' is compressed with zstandard, which has to be installed to load it"
+                )
+            buffer = io.BytesIO()
+            with open(path, "rb") as model_file:
+                zstandard.ZstdDecompressor().copy_stream(model_file, buffer)
+            buffer.seek(0)
+            path = buffer
+        # the file contains the pickled ModelWrapper, not only weights
+        inst = torch.load(path, map_location=torch.device(locate), weights_only=False)
         if not isinstance(inst, ModelWrapper):
             raise RuntimeError(
                 f"you tryied to load from '{path}' but the object was not a ModelWrapper"
@@ -939,8 +1113,8 @@ class ModelHandler:
         return inst
 
     @staticmethod
-    def save_model(model: ModelWrapper, path: str):
-        """Saves model to file. Same as `torch.save(...)`.
+    def save_model(model: ModelWrapper, path: str, compress: bool = False):
+        """Saves model to file. Same as `torch.save(...)` with pickle protocol 5.
 
         Parameters
         ----------
@@ -948,12 +1122,26 @@ class ModelHandler:
             The model to be saved
         path: str
             Path to the file where the model is saved
+        compress: bool, default = False
+            Whether to compress the file with zstandard, if it is installed.
         """
-        torch.save(model, path)
+        if compress and zstandard is None:
+            logger.warning("zstandard is not installed, the model is saved uncompressed")
+            compress = False
+        if not compress:
+            torch.save(model, path, pickle_protocol=5)
+            return
+        buffer = io.BytesIO()
+        torch.save(model, buffer, pickle_protocol=5)
+        buffer.seek(0)
+        with open(path, "wb") as model_file:
+            zstandard.ZstdCompressor(level=3, threads=-1).copy_stream(buffer, model_file)
 
     def save_current_model(self, path: str):
         """Saves internal model to file`.
 
+        The file is compressed if "compress_model" is set in the config.
+
         Parameters
         ----------
         path: str
@@ -963,13 +1151,19 @@ class ModelHandler:
             raise RuntimeError(
                 "The Model is not initialized and can thus not be saved."
             )
-        torch.save(self.model_wrap, path)
+        self.save_model(
+            self.model_wrap, path, compress=self.config.get("compress_model", False)
+        )
         return self
 
     @staticmethod
     def make_study(
         direction: Union[Literal["minimize"], Literal["maximize"]] = "minimize",
-        pruner: optuna.pruners.BasePruner = optuna.pruners.MedianPruner(),
+        pruner: optuna.pruners.BasePruner = optuna.pruners.MedianPruner(
+            n_warmup_steps=5
+        ),
+        storage: Union[str, optuna.storages.BaseStorage] = None,
+        study_name: str = None,
     ):
         """
         Creates a optuna study for hyperparameter tuning.
@@ -978,8 +1172,14 @@ class ModelHandler:
         ----------
         direction: Union["minimize", "maximize"], default = "minimize"
             Defines if the study should minimize odr maximize the objective
-        pruner: optuna.pruners.BasePruner, default = optuna.pruners.MedianPruner()
-            Strategy to terminate less promissing trials ahead of time
+        pruner: optuna.pruners.BasePruner, default = optuna.pruners.MedianPruner(n_warmup_steps=5)
+            Strategy to terminate less promissing trials ahead of time, based on the validation loss after each epoch.
+        storage: Union[str, optuna.storages.BaseStorage], default = None
+            Database URL or storage object in which the study is kept. The study is kept in memory if None.
+            An existing study with the same name is loaded from the storage, this allows multiple processes to work on the same study.
+            Sqlite databases are used in write-ahead logging mode, so concurrent processes do not block each other.
+        study_name: str, default = None
+            Name of the study, needed to identify the study in a storage.
 
         Returns
         -------
@@ -994,10 +1194,15 @@ class ModelHandler:
         sampler = optuna.samplers.TPESampler(
             # seed=seed
         )  # Make the sampler behave in a deterministic way.
+        if isinstance(storage, str) and storage.startswith("sqlite:///"):
+            storage = _sqlite_storage(storage)
         study = optuna.create_study(
             sampler=sampler,
             direction=direction,
             pruner=pruner,
+            storage=storage,
+            study_name=study_name,
+            load_if_exists=storage is not None,
         )
         return study
 
@@ -1006,6 +1211,7 @@ class ModelHandler:
         tuning_settings: Dict[str, Any],
         train_data: proloaf.tensorloader.TimeSeriesData,
         validation_data: proloaf.tensorloader.TimeSeriesData,
+        model_dir: str = None,
     ):
         """
         Creates a callable to evaluate a parameter configuration.
@@ -1021,6 +1227,9 @@ class ModelHandler:
             The training data
         validation_data : proloaf.tensorloader.TimeSeriesData
             The validation data
+        model_dir: str, default = None
+            Directory in which the model of each trial is saved. If None the model is attached to the trial instead,
+            which is only possible if the study is kept in memory.
         Returns
         -------
         Callable
@@ -1054,24 +1263,78 @@ class ModelHandler:
                         **(hparam["kwargs"])
                     )
 
+            # the trial is pruned during training, if its validation loss falls behind
             model_wrap = self.run_training(
                 train_data,
                 validation_data,
                 hparams=hparams,
                 trial_id=trial.number,
+                trial=trial,
             )
             model_wrap.last_training.remove_data()
-            trial.set_user_attr("wrapped_model", model_wrap)
-            trial.set_user_attr("training_run", model_wrap.last_training)
-            # Handle pruning based on the intermediate value.
-            if trial.should_prune():
-                raise optuna.exceptions.TrialPruned()
-
+            if model_dir is None:
+                trial.set_user_attr("wrapped_model", model_wrap)
+                trial.set_user_attr("training_run", model_wrap.last_training)
+            else:
+                os.makedirs(model_dir, exist_ok=True)
+                model_path = os.path.join(model_dir, f"trial_{trial.number}.pkl")
+                self.save_model(
+                    model_wrap,
+                    model_path,
+                    compress=self.config.get("compress_model", False),
+                )
+                trial.set_user_attr("model_path", model_path)
             return model_wrap.last_training.validation_loss
 
         return search_params
 
 
+def _make_grad_scaler(device_type: str):
+    # the device independent scaler is only available since torch 2.3
+    if hasattr(torch.amp, "GradScaler"):
+        return torch.amp.GradScaler(device_type)
+    return torch.cuda.amp.GradScaler()
+
+
+def _tuning_worker(
+    rank: int,
+    modelhandler: ModelHandler,
+    train_data: proloaf.tensorloader.TimeSeriesData,
+    validation_data: proloaf.tensorloader.TimeSeriesData,
+    storage: str,
+    study_name: str,
+    model_dir: str,
+    number_of_tests: int,
+    n_workers: int,
+    timeout: float = None,
+):
+    """Runs trials of a shared study in a separate process, see `ModelHandler.tune_hyperparameters`.
+    The `number_of_tests` trials are split evenly between the `n_workers` workers,
+    so exactly that many trials are run in total, as when tuning in a single process.
+    If multiple GPUs are available the workers are distributed over them.
+    """
+    n_trials = number_of_tests // n_workers + int(rank < number_of_tests % n_workers)
+    if n_trials == 0:
+        return
+    if torch.device(modelhandler._device).type == "cuda" and torch.cuda.device_count() > 1:
+        device = rank % torch.cuda.device_count()
+        torch.cuda.set_device(device)
+        modelhandler.to(device)
+        train_data.to(device)
+        validation_data.to(device)
+    study = modelhandler.make_study(storage=storage, study_name=study_name)
+    study.optimize(
+        modelhandler.tuning_objective(
+            modelhandler.tuning_config["settings"],
+            train_data=train_data,
+            validation_data=validation_data,
+            model_dir=model_dir,
+        ),
+        n_trials=n_trials,
+        timeout=timeout,
+    )
+
+
 class TrainingRun:
     """Class representing a single training of a PyTorch model.
 
@@ -1097,6 +1360,9 @@ class TrainingRun:
         Minimum improvement to be considered in early stopping.
     batch_size: int, default = 100,
         Number of samples per batch. Defaults to all samples in a single batch.
+    validation_batch_size: int, default = None
+        Number of samples per batch during validation. As no gradients are stored during validation,
+        this defaults to four times the batch size.
     history_horizon: int, default = 24
         Timesteps of data given to the encoder.
     forecast_horizon: int = None,
@@ -1107,6 +1373,24 @@ class TrainingRun:
         Device the training is run on. See `torch.Tensor.to(...)` for additional inforamtion.
     log_tb: torch.utils.tensorboard.SummaryWriter, default = None,
         Tensorboard writer to log the training. If none Training will not be logged.
+    log_graph: bool, default = True
+        Whether to add the graph of the model to the TensorBoard log, requires tracing the model.
+    compile_model: bool, default = False
+        Whether to compile the model with `torch.compile` for training on CUDA devices.
+        If the compilation fails the training falls back to eager execution.
+    cuda_graph: bool, default = False
+        Whether to capture forward pass, backward pass and optimizer step in a CUDA graph which is replayed for each batch.
+        Only used on CUDA devices for models that are not compiled, all batches need to have the same shape.
+        Not used in distributed training.
+    num_workers: int, default = 0
+        Number of worker processes used to load batches (see `TimeSeriesData.make_data_loader`).
+    trial: optuna.trial.Trial, default = None
+        Trial of a hyperparameter search. The validation loss is reported to it after each epoch
+        and training is aborted with `optuna.exceptions.TrialPruned` if the trial should be pruned.
+    precision: str, default = "32-true"
+        Numerical precision used in training. With "bf16-mixed" or "16-mixed" the forward pass and the loss are computed in
+        bfloat16 or float16 autocast (automatic mixed precision), while the weights are kept in float32.
+        For "16-mixed" the loss is scaled to avoid underflowing gradients, which is not compatible with `cuda_graph`.
 
     Attributes
     ----------
@@ -1140,11 +1424,18 @@ class TrainingRun:
         early_stopping_patience: int = 7,
         early_stopping_margin: float = 0.0,
         batch_size: int = None,
+        validation_batch_size: int = None,
         history_horizon: int = 24,
         forecast_horizon: int = 24,
         id: Union[str, int] = None,
         device: str = "cpu",
         log_tb: torch.utils.tensorboard.SummaryWriter = None,
+        log_graph: bool = True,
+        compile_model: bool = False,
+        cuda_graph: bool = False,
+        precision: str = "32-true",
+        num_workers: int = 0,
+        trial: optuna.trial.Trial = None,
     ):
         if id is None:
             self.id = TrainingRun._next_id
@@ -1163,6 +1454,29 @@ class TrainingRun:
         self.optimizer_name = optimizer_name
         self.learning_rate = learning_rate
         self.batch_size = batch_size
+        if validation_batch_size is None and batch_size is not None:
+            validation_batch_size = 4 * batch_size
+        self.validation_batch_size = validation_batch_size
+        self.device = device
+        self.cuda_graph = cuda_graph
+        self.num_workers = num_workers
+        self.trial = trial
+        if precision not in _AUTOCAST_DTYPES:
+            raise AttributeError(
+                f"Unknown precision '{precision}', use one of {list(_AUTOCAST_DTYPES)}"
+            )
+        self.precision = precision
+        # loss scaling is only needed for float16
+        self._grad_scaler = (
+            _make_grad_scaler(torch.device(device).type)
+            if precision == "16-mixed"
+            else None
+        )
+        self._graph = None
+        self._static_batch = None
+        self._static_loss = None
+        self._n_train_batches = None
+        self._n_validation_batches = None
         self.set_optimizer(optimizer_name, learning_rate)
         self.loss_function = loss_function
         self.step_counter = 0
@@ -1171,6 +1485,10 @@ class TrainingRun:
             patience=early_stopping_patience, delta=early_stopping_margin
         )
         self.log_tb = log_tb
+        self.log_graph = log_graph
+        self.compile_model = compile_model
+        self._train_model = None
+        self._compiled_model = None
         self.training_start_time = None
         self.training_end_time = None
         self.to(device)
@@ -1233,101 +1551,355 @@ class TrainingRun:
                 "The model has to be initialized before the optimizer is set."
             )
         if optimizer_name == "adam":
-            self.optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
+            self.optimizer = torch.optim.Adam(
+                self.model.parameters(),
+                lr=learning_rate,
+                **self._multi_tensor_options(torch.optim.Adam),
+                **self._capturable_options(torch.optim.Adam),
+            )
         if optimizer_name == "sgd":
             self.optimizer = torch.optim.SGD(
-                self.model.parameters(), lr=learning_rate, momentum=0.5
+                self.model.parameters(),
+                lr=learning_rate,
+                momentum=0.5,
+                **self._multi_tensor_options(torch.optim.SGD, fused=False),
             )
         if optimizer_name == "adamw":
             self.optimizer = torch.optim.AdamW(
-                self.model.parameters(), lr=learning_rate
+                self.model.parameters(),
+                lr=learning_rate,
+                **self._multi_tensor_options(torch.optim.AdamW),
+                **self._capturable_options(torch.optim.AdamW),
             )
         if optimizer_name == "adagrad":
             self.optimizer = torch.optim.Adagrad(
-                self.model.parameters(), lr=learning_rate
+                self.model.parameters(),
+                lr=learning_rate,
+                **self._multi_tensor_options(torch.optim.Adagrad, fused=False),
             )
         if optimizer_name == "adamax":
             self.optimizer = torch.optim.Adamax(
-                self.model.parameters(), lr=learning_rate
+                self.model.parameters(),
+                lr=learning_rate,
+                **self._multi_tensor_options(torch.optim.Adamax),
             )
         if optimizer_name == "rmsprop":
             self.optimizer = torch.optim.RMSprop(
-                self.model.parameters(), lr=learning_rate
+                self.model.parameters(),
+                lr=learning_rate,
+                **self._multi_tensor_options(torch.optim.RMSprop),
             )
         if self.optimizer is None:
             raise AttributeError(f"Could find optimizer with name {optimizer_name}.")
         return self
 
+    def _multi_tensor_options(
+        self, optimizer_class: type, fused: bool = True
+    ) -> Dict[str, bool]:
+        """Keyword arguments to update all parameters of the model in as few kernels as possible.
+        Fused implementations are used on CUDA devices if the optimizer provides one, otherwise the foreach implementation.
+        """
+        parameters = inspect.signature(optimizer_class).parameters
+        if fused and "fused" in parameters and torch.device(self.device).type == "cuda":
+            return {"fused": True}
+        if "foreach" in parameters:
+            return {"foreach": True}
+        return {}
+
+    def _capturable_options(self, optimizer_class: type) -> Dict[str, bool]:
+        """Keyword arguments to keep the state of the optimizer (e.g. the step count) on a CUDA device.
+        This avoids host-device round trips in each step and is required to capture the step in a CUDA graph.
+        Optimizers or PyTorch versions without this option keep their state on the host.
+        """
+        parameters = inspect.signature(optimizer_class).parameters
+        if "capturable" in parameters and torch.device(self.device).type == "cuda":
+            return {"capturable": True}
+        return {}
+
     def reset(self):
         """Reset the Training. The model state will not be reset."""
         self.step_counter = 0
         self.validation_loss = np.inf
         self.training_loss = np.inf
 
+    def _use_compile(self) -> bool:
+        return (
+            self.compile_model
+            and hasattr(torch, "compile")
+            and torch.device(self.device).type == "cuda"
+        )
+
+    def _compile(self, inputs_enc: torch.Tensor, inputs_dec: torch.Tensor):
+        """Compile the model for training, returns the model itself if that is not possible."""
+        if not self._use_compile():
+            return self._train_model
+        try:
+            compiled_model = torch.compile(self._train_model, mode="reduce-overhead")
+            # compilation happens on the first call, so errors only show up there
+            with self._autocast():
+                compiled_model(inputs_enc, inputs_dec)
+        except Exception as exc:
+            logger.warning(f"Could not compile the model, training in eager mode: {exc}")
+            return self._train_model
+        return compiled_model
+
+    def _wrap_distributed(self) -> torch.nn.Module:
+        """Wrap the model for data parallel training, if a process group has been initialized."""
+        if not _is_distributed():
+            return self.model
+        device = torch.device(self.device)
+        # gradients are averaged in buckets while the backward pass is still running
+        return torch.nn.parallel.DistributedDataParallel(
+            self.model,
+            device_ids=[device.index or torch.cuda.current_device()]
+            if device.type == "cuda"
+            else None,
+            gradient_as_bucket_view=True,
+            bucket_cap_mb=25,
+        )
+
+    def _training_module(self) -> torch.nn.Module:
+        if self._compiled_model is not None:
+            return self._compiled_model
+        if self._train_model is not None:
+            return self._train_model
+        return self.model
+
+    def _autocast(self):
+        dtype = _AUTOCAST_DTYPES[self.precision]
+        return torch.autocast(
+            device_type=torch.device(self.device).type,
+            dtype=dtype,
+            enabled=dtype is not None,
+        )
+
+    def _use_cuda_graph(self) -> bool:
+        # loss scaling checks the gradients on the host, which can not be captured
+        return (
+            self.cuda_graph
+            and torch.device(self.device).type == "cuda"
+            and self._grad_scaler is None
+            and not _is_distributed()
+        )
+
+    def _capture_graph(
+        self, inputs_enc: torch.Tensor, inputs_dec: torch.Tensor, targets: torch.Tensor
+    ):
+        """Capture a whole optimization step in a CUDA graph, that can be replayed with new data
+        copied into the static inputs. Training continues in eager mode if the capture fails.
+        The optimization steps of the warmup are undone afterwards, so they do not change the training.
+        """
+        self._static_batch = (inputs_enc.clone(), inputs_dec.clone(), targets.clone())
+        saved_params = [param.detach().clone() for param in self.model.parameters()]
+        saved_optimizer_state = {
+            param: {
+                key: value.clone() if torch.is_tensor(value) else value
+                for key, value in state.items()
+            }
+            for param, state in self.optimizer.state.items()
+        }
+        side_stream = None
+        try:
+            # warmup on a side stream, as required before capturing
+            side_stream = torch.cuda.Stream()
+            side_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(side_stream):
+                for _ in range(3):
+                    self.optimizer.zero_grad(set_to_none=True)
+                    self._optimization_step(*self._static_batch)
+            torch.cuda.current_stream().wait_stream(side_stream)
+
+            graph = torch.cuda.CUDAGraph()
+            self.optimizer.zero_grad(set_to_none=True)
+            with torch.cuda.graph(graph):
+                self._static_loss = self._optimization_step(*self._static_batch)
+        except RuntimeError as exc:
+            # CUDA errors and unsupported operations during the capture are raised as RuntimeError
+            logger.warning(f"Could not capture the training step in a CUDA graph: {exc}")
+            if side_stream is not None:
+                # the warmup may still be running on the side stream
+                torch.cuda.current_stream().wait_stream(side_stream)
+            self._graph = None
+            self._static_batch = None
+            self._static_loss = None
+            # gradients may live in the memory pool of the failed capture
+            self.optimizer.zero_grad(set_to_none=True)
+            self._restore_state(saved_params, saved_optimizer_state, keep_new_state=False)
+            return self
+        self._restore_state(saved_params, saved_optimizer_state)
+        self._graph = graph
+        return self
+
+    def _restore_state(
+        self,
+        saved_params: List[torch.Tensor],
+        saved_optimizer_state: dict,
+        keep_new_state: bool = True,
+    ):
+        """Resets parameters and optimizer state to the saved values.
+        State created since it was saved is zeroed if `keep_new_state` is set, as a captured graph refers to it,
+        otherwise it is removed, so the optimizer initializes it again in the next step.
+        """
+        # the captured graph uses the existing tensors, so they are overwritten instead of replaced
+        with torch.no_grad():
+            for param, value in zip(self.model.parameters(), saved_params):
+                param.copy_(value)
+            for param in list(self.optimizer.state):
+                state = self.optimizer.state[param]
+                saved_state = saved_optimizer_state.get(param)
+                if saved_state is None and not keep_new_state:
+                    del self.optimizer.state[param]
+                    continue
+                saved_state = saved_state or {}
+                for key, value in list(state.items()):
+                    if key not in saved_state and not keep_new_state:
+                        del state[key]
+                    elif torch.is_tensor(value):
+                        # state created during the warmup starts from zero (e.g. moments and step count of adam)
+                        if key in saved_state:
+                            value.copy_(saved_state[key])
+                        else:
+                            value.zero_()
+                    elif key in saved_state:
+                        state[key] = saved_state[key]
+                    elif isinstance(value, (int, float)):
+                        state[key] = 0
+
+    def _optimization_step(
+        self, inputs1: torch.Tensor, inputs2: torch.Tensor, targets: torch.Tensor
+    ) -> torch.Tensor:
+        with self._autocast():
+            prediction, _ = self.model(inputs1, inputs2)
+            loss = self.loss_function(targets, prediction)
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(
+            self.model.parameters(), 1, error_if_nonfinite=False
+        )
+        self.optimizer.step()
+        return loss
+
     def step(self):
         """Perform optimization of a single run through all batches."""
-        self.training_loss = 0.0
+        # accumulate on the device, to avoid synchronizing with the host after every batch
+        training_loss = torch.zeros((), device=self.device)
+        model = self._training_module()
 
         self.model.train()
         # train step
         for (inputs1, inputs2, targets) in self.train_dl:
-            prediction, _ = self.model(inputs1, inputs2)
-            self.optimizer.zero_grad()
-            loss = self.loss_function(targets, prediction)
-            loss.backward()
-            torch.nn.utils.clip_grad_norm_(self.model.parameters(), 1)
-            self.optimizer.step()
+            if self._graph is not None:
+                for static, new in zip(self._static_batch, (inputs1, inputs2, targets)):
+                    static.copy_(new, non_blocking=True)
+                self._graph.replay()
+                self.step_counter += 1
+                training_loss += self._static_loss.detach()
+                continue
+            with self._autocast():
+                prediction, _ = model(inputs1, inputs2)
+                loss = self.loss_function(targets, prediction)
+            self.optimizer.zero_grad(set_to_none=True)
+            if self._grad_scaler is None:
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(
+                    self.model.parameters(), 1, error_if_nonfinite=False
+                )
+                self.optimizer.step()
+            else:
+                self._grad_scaler.scale(loss).backward()
+                # gradients have to be unscaled before clipping
+                self._grad_scaler.unscale_(self.optimizer)
+                torch.nn.utils.clip_grad_norm_(
+                    self.model.parameters(), 1, error_if_nonfinite=False
+                )
+                self._grad_scaler.step(self.optimizer)
+                self._grad_scaler.update()
             self.step_counter += 1
-            self.training_loss += loss.item() / len(self.train_dl)
-
+            training_loss += loss.detach()
+        # an empty data loader yields a loss of 0 like the validation
+        n_batches = self._n_train_batches or len(self.train_dl)
+        self.training_loss = (training_loss / max(n_batches, 1)).item()
         return self
 
     def validate(self):
         """Validate model performance on an unseen dataset."""
-        with torch.no_grad():
+        model = self._training_module()
+        with torch.inference_mode():
             self.model.eval()
-            self.validation_loss = 0.0
+            # the loss stays on the device and is only synchronized once per validation
+            validation_loss = torch.zeros((), device=self.device)
+            n_samples = 0
             for (inputs1, inputs2, targets) in self.validation_dl:
-                output, _ = self.model(inputs1, inputs2)
-                self.validation_loss += self.loss_function(
-                    targets, output
-                ).item() / len(self.validation_dl)
+                with self._autocast():
+                    output, _ = model(inputs1, inputs2)
+                    loss = self.loss_function(targets, output)
+                # the last batch can be smaller, so batch losses are weighted by their size
+                validation_loss += loss * targets.shape[0]
+                n_samples += targets.shape[0]
+            self.validation_loss = (validation_loss / max(n_samples, 1)).item()
         return self
 
     def train(self):
         """Run the whole training process including validation if validation data was provided.
         The training will be stopped early if the validation loss stops improving.
         """
-        if not self.train_dl:
+        if self.train_dl is None:
             if not self.train_ds:
                 raise AttributeError("No training data provided")
             self.train_dl = self.train_ds.make_data_loader(
                 history_horizon=self.history_horizon,
                 forecast_horizon=self.forecast_horizon,
                 batch_size=self.batch_size,
+                distributed=_is_distributed(),
+                num_workers=self.num_workers,
             )
 
-        if not self.validation_dl:
+        if self.validation_dl is None:
             if self.validation_ds:
                 self.validation_dl = self.validation_ds.make_data_loader(
                     history_horizon=self.history_horizon,
                     forecast_horizon=self.forecast_horizon,
-                    batch_size=self.batch_size,
+                    batch_size=self.validation_batch_size,
+                    shuffle=False,
+                    drop_last=False,
+                    num_workers=self.num_workers,
                 )
-        if self.log_tb:
-            # is this actually for every run or model specific
+        # number of batches does not change during training
+        self._n_train_batches = len(self.train_dl)
+        self._n_validation_batches = (
+            len(self.validation_dl) if self.validation_dl is not None else 0
+        )
+        if (self.log_tb and self.log_graph) or self._use_compile() or self._use_cuda_graph():
             inputs_enc, inputs_dec, targets = next(iter(self.train_dl))
-            self.log_tb.add_graph(self.model, [inputs_enc, inputs_dec])
+        if self.log_tb and self.log_graph:
+            # is this actually for every run or model specific
+            # the graph is traced on the uncompiled model in full precision
+            self.log_tb.add_graph(self.model, [inputs_enc.float(), inputs_dec.float()])
+        if self.log_tb:
+            # histograms are only logged for about 20 epochs and written in the background
+            histogram_interval = max(1, self.max_epochs // 20)
+            histogram_executor = ThreadPoolExecutor(max_workers=1)
         self.training_start_time = perf_counter()
         logger.info("Begin training...")
         self.model.train()
+        self._train_model = self._wrap_distributed()
+        pruned = False
+        if self._use_compile():
+            self._compiled_model = self._compile(inputs_enc, inputs_dec)
+        if self._use_cuda_graph() and self._compiled_model in (None, self.model):
+            self._capture_graph(inputs_enc, inputs_dec, targets)
         for epoch in range(self.max_epochs):
             t1_start = perf_counter()
+            if hasattr(self.train_dl.sampler, "set_epoch"):
+                # reshuffle the shares of the processes in distributed training
+                self.train_dl.sampler.set_epoch(epoch)
             self.step()
             t1_stop = perf_counter()
-            if self.validation_dl:
+            if self._n_validation_batches:
                 self.validate()
                 self.early_stopping(self.validation_loss, self.model)
+                if self.trial is not None:
+                    self.trial.report(self.validation_loss, epoch)
+                    pruned = self.trial.should_prune()
             else:
                 logger.warning(
                     "No validation data was provided, thus no validation was performed"
@@ -1352,6 +1924,8 @@ class TrainingRun:
                     epoch_start=t1_start,
                     next_epoch=epoch + 1,
                     step_counter=self.step_counter,
+                    log_histograms=(epoch + 1) % histogram_interval == 0,
+                    executor=histogram_executor,
                 )
 
             if self.early_stopping.early_stop:
@@ -1359,13 +1933,27 @@ class TrainingRun:
                     f"No improvement has been achieved in the last {self.early_stopping.patience} epochs. Aborting training and loading best model."
                 )
                 # load the last checkpoint with the best model
-                self.model.load_state_dict(
-                    torch.load(self.early_stopping.temp_dir + "checkpoint.pt")
-                )
+                self.model.load_state_dict(self.early_stopping.best_state)
                 self.validation_loss = self.early_stopping.val_loss_min
                 break
+            if pruned:
+                logger.info(f"Trial {self.trial.number} was pruned after {epoch + 1} epochs.")
+                break
+        if self.log_tb:
+            histogram_executor.shutdown(wait=True)
+        # the wrapped models and the graph are only needed during training and can not be saved
+        self._train_model = None
+        self._compiled_model = None
+        self._graph = None
+        self._static_batch = None
+        self._static_loss = None
+        # the checkpoint and the trial would otherwise be saved along with the model
+        self.early_stopping.best_state = None
+        self.trial = None
         self.model.eval()
         self.training_end_time = t1_stop
+        if pruned:
+            raise optuna.exceptions.TrialPruned()
         return self
 
     def to(self, device: str):
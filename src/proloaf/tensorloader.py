@@ -21,13 +21,26 @@
 Provides structures for storing and loading data (e.g. training, validation or test data)
 """
 from __future__ import annotations
-from typing import Union, Tuple, Callable, Iterable
+from collections import OrderedDict
+from typing import Union, Tuple, Callable, Iterable, Sequence
+import numpy as np
 import pandas as pd
 import torch
 from proloaf.event_logging import create_event_logger
 
 logger = create_event_logger(__name__)
 
+# number of feature selections for which the tensors are kept, e.g. while tuning over feature sets
+_TENSOR_CACHE_SIZE = 4
+
+# storage types that can be selected by name, e.g. in a config file
+DATASET_DTYPES = {
+    "float32": torch.float32,
+    "bfloat16": torch.bfloat16,
+    "float16": torch.float16,
+    "int8": torch.int8,
+}
+
 class TimeSeriesData(torch.utils.data.Dataset):
     """Contains timeseries data in pandas dataframe in addition to a Torch.Tensor based representation used in deep learning.
 
@@ -48,7 +61,19 @@ class TimeSeriesData(torch.utils.data.Dataset):
     preparation_steps: Iterable[Callable[[pd.DataFrame], pd.DataFrame]] (optional)
         Functions or callables that transform the dataframe in any way before it is fed to the model. Both input and output need to be a pandas.Dataframe.
     device: Union[int, str], default = "cpu"
-        Device ony which the data should be loaded, can be changed later.
+        Device to which batches are moved when iterating over a data loader, can be changed later.
+        The tensors themselves are kept in host memory, batches are packed into page-locked buffers if the device is a GPU.
+    dataset_dtype: Union[torch.dtype, str], default = torch.float32
+        Data type in which encoder and decoder features are stored, either a torch.dtype or one of the names in `DATASET_DTYPES`.
+        Lower precision types like `torch.bfloat16` halve memory and transfer volume, but should only be used for mixed precision training.
+        With `torch.int8` each feature is quantized symmetrically with its own scale and converted back to float32
+        once a batch has been moved to the device (see `TensorDataLoader`). Targets are always stored as float32.
+    pin_memory: bool (optional)
+        Whether batches are packed into page-locked memory before being copied to a GPU, which makes the copies asynchronous.
+        By default this is done whenever the device is a GPU. With `keep_on_device` the stored tensors are page-locked once instead.
+    keep_on_device: bool, default = False
+        Whether the tensors are copied to the GPU as a whole instead of transferring each batch, if the device is a GPU.
+        The copy is issued on a separate stream when the tensors are created, so it overlaps with work on the host.
 
     Attributes
     ----------
@@ -66,12 +91,38 @@ class TimeSeriesData(torch.utils.data.Dataset):
         See Parameters
     self.device
         See Parameters
+    self.dataset_dtype
+        See Parameters, always a torch.dtype
+    self.encoder_scale: torch.Tensor
+        Per feature scale of the quantized encoder features, None unless the features are stored as int8
+    self.decoder_scale: torch.Tensor
+        Per feature scale of the quantized decoder features, None unless the features are stored as int8
+    self.future_tensor: torch.Tensor
+        Decoder features and targets concatenated along the features, None unless the decoder features are stored as float32.
+        `self.decoder_tensor` and `self.target_tensor` are views into it.
+    self.pin_memory
+        See Parameters
+    self.keep_on_device
+        See Parameters
     self.tensor_prepared: bool
         Tells whether all preparation steps have been applied to the Tensor representation of the data. This needs to be True before accessing data by indexing (see `to_tensor()`).
     self.frame_prepared: bool
         Tells whether all preparation steps have been applied to the DataFrame representation of the data.
     self.preparation_steps:
         See Parameters
+
+    Notes
+    -----
+    Features are stored time-major as contiguous tensors of shape (timesteps, features), one each for encoder,
+    decoder and targets. A sample is a slice along the first dimension and thus a contiguous view,
+    a batch is gathered with a single indexing operation into a contiguous tensor of shape (batch, timesteps, features).
+    Batches of consecutive samples (i.e. without shuffling) are copied from a strided view of the overlapping windows,
+    so they are contiguous as well and do not share memory with the stored tensors.
+    This is the layout expected by the recurrent models, which are built with `batch_first=True`,
+    so batches are passed on without further transposes or copies.
+    If the decoder features are stored as float32, decoder features and targets are kept in a single tensor
+    (`self.future_tensor`), as they cover the same timesteps. Both are then gathered at once
+    and the decoder inputs and targets of a batch are views into the same tensor.
     """
 
     def __init__(
@@ -84,8 +135,17 @@ class TimeSeriesData(torch.utils.data.Dataset):
         target_id: Union[str, Iterable[str]] = None,
         preparation_steps: Iterable[Callable[[pd.DataFrame], pd.DataFrame]] = None,
         device: Union[int, str] = "cpu",
+        dataset_dtype: Union[torch.dtype, str] = torch.float32,
+        pin_memory: bool = None,
+        keep_on_device: bool = False,
         **_,
     ):
+        if isinstance(dataset_dtype, str):
+            if dataset_dtype not in DATASET_DTYPES:
+                raise AttributeError(
+                    f"dataset_dtype has to be one of {tuple(DATASET_DTYPES)} but was '{dataset_dtype}'"
+                )
+            dataset_dtype = DATASET_DTYPES[dataset_dtype]
         self.data = df
 
         self.encoder_features = encoder_features
@@ -95,9 +155,21 @@ class TimeSeriesData(torch.utils.data.Dataset):
         self.target_id = target_id
 
         self.device = device
+        self.dataset_dtype = dataset_dtype
+        self.encoder_scale = None
+        self.decoder_scale = None
+        self.future_tensor = None
+        self.pin_memory = pin_memory
+        self.keep_on_device = keep_on_device
+        self._copy_stream = None
         self.tensor_prepared = False
         self.frame_prepared = False
         self.preparation_steps = preparation_steps
+        # result of the preparation steps if they were only applied for creating the tensors
+        self._prepared_frame = None
+        # tensors only depend on the selected features, not on horizons or batch size,
+        # the least recently used selections are dropped, see `_cache_tensors`
+        self._tensor_cache = OrderedDict()
 
     @property
     def encoder_features(self):
@@ -153,7 +225,8 @@ class TimeSeriesData(torch.utils.data.Dataset):
             raise AttributeError(
                 "Number of samples depends on both history- and forecast_horizon which have not been set."
             )
-        return max(0, len(self.data) - self.history_horizon - self.forecast_horizon) + 1
+        data = self.data if self._prepared_frame is None else self._prepared_frame
+        return max(0, len(data) - self.history_horizon - self.forecast_horizon) + 1
 
     def __iter__(self):
         self._index = 0
@@ -178,6 +251,8 @@ class TimeSeriesData(torch.utils.data.Dataset):
         self.preparation_steps.append(step)
         self.frame_prepared = False
         self.tensor_prepared = False
+        self._prepared_frame = None
+        self._tensor_cache.clear()
         return self
 
     def clear_preparation_steps(self):
@@ -199,6 +274,8 @@ class TimeSeriesData(torch.utils.data.Dataset):
             )
         self.preparation_steps = None
         self.tensor_prepared = False
+        self._prepared_frame = None
+        self._tensor_cache.clear()
         return self
 
     @staticmethod
@@ -230,7 +307,11 @@ class TimeSeriesData(torch.utils.data.Dataset):
         if self.preparation_steps is None or self.frame_prepared:
             self.frame_prepared = True
             return self
-        self.data = self._apply_prep_to_frame(self.data, self.preparation_steps)
+        if self._prepared_frame is not None:
+            self.data = self._prepared_frame
+            self._prepared_frame = None
+        else:
+            self.data = self._apply_prep_to_frame(self.data, self.preparation_steps)
         self.frame_prepared = True
         return self
 
@@ -274,10 +355,12 @@ class TimeSeriesData(torch.utils.data.Dataset):
         Returns
         -------
         Tuple[torch.Tensor, torch.Tensor, torch.Tensor]
-            3 DataFrames (Data for encoder, Data for decoder, Targets)
+            3 DataFrames (Data for encoder, Data for decoder, Targets).
+            Quantized features are converted back to float32.
 
         """
-        return (
+        self.wait_for_device()
+        inputs_enc, inputs_dec = self.dequantize(
             self.encoder_tensor[idx : idx + self.history_horizon],
             self.decoder_tensor[
                 idx
@@ -285,6 +368,10 @@ class TimeSeriesData(torch.utils.data.Dataset):
                 + self.history_horizon
                 + self.forecast_horizon
             ],
+        )
+        return (
+            inputs_enc,
+            inputs_dec,
             self.target_tensor[
                 idx
                 + self.history_horizon : idx
@@ -293,9 +380,95 @@ class TimeSeriesData(torch.utils.data.Dataset):
             ],
         )
 
+    def __getitems__(
+        self, indices: Union[Sequence[int], slice]
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Gets a whole batch of samples, using a single indexing operation per tensor instead of one per sample.
+        Used by the torch.DataLoader to fetch batches.
+
+        Parameters
+        ----------
+        indices: Union[Sequence[int], slice]
+            Starting indices of the samples. A slice of consecutive indices (with step 1) is copied
+            from a strided view of the stored tensors, without building the index tensors.
+
+        Returns
+        -------
+        Tuple[torch.Tensor, torch.Tensor, torch.Tensor]
+            3 Tensors (Data for encoder, Data for decoder, Targets) of shape (batch, timesteps, features)
+
+        """
+        self.wait_for_device()
+        if isinstance(indices, slice):
+            start, stop, _ = indices.indices(len(self))
+            future_start = start + self.history_horizon
+            num_samples = stop - start
+            history_batch = _windows(
+                self.encoder_tensor, start, num_samples, self.history_horizon
+            )
+            if self.future_tensor is not None:
+                return (
+                    history_batch,
+                    *self._split_future(
+                        _windows(
+                            self.future_tensor,
+                            future_start,
+                            num_samples,
+                            self.forecast_horizon,
+                        )
+                    ),
+                )
+            return (
+                history_batch,
+                _windows(
+                    self.decoder_tensor, future_start, num_samples, self.forecast_horizon
+                ),
+                _windows(
+                    self.target_tensor, future_start, num_samples, self.forecast_horizon
+                ),
+            )
+        device = self.encoder_tensor.device
+        starts = torch.as_tensor(indices, dtype=torch.long, device=device).unsqueeze(1)
+        history = starts + torch.arange(self.history_horizon, device=device)
+        future = starts + (
+            self.history_horizon + torch.arange(self.forecast_horizon, device=device)
+        )
+        if self.future_tensor is not None:
+            return (
+                _gather(self.encoder_tensor, history),
+                *self._split_future(_gather(self.future_tensor, future)),
+            )
+        return (
+            _gather(self.encoder_tensor, history),
+            _gather(self.decoder_tensor, future),
+            _gather(self.target_tensor, future),
+        )
+
+    def _split_future(self, future: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        # decoder features come first in the last dimension, the views share memory with `future`
+        return future.split(
+            [self.decoder_tensor.shape[-1], self.target_tensor.shape[-1]], dim=-1
+        )
+
+    def _stored_tensors(self) -> Tuple[torch.Tensor, ...]:
+        # the tensors holding the data, the others are views into them
+        if self.future_tensor is not None:
+            return self.encoder_tensor, self.future_tensor
+        return self.encoder_tensor, self.decoder_tensor, self.target_tensor
+
+    def _set_stored_tensors(self, tensors: Sequence[torch.Tensor]):
+        if self.future_tensor is not None:
+            self.encoder_tensor, self.future_tensor = tensors
+            self.decoder_tensor, self.target_tensor = self._split_future(
+                self.future_tensor
+            )
+        else:
+            self.encoder_tensor, self.decoder_tensor, self.target_tensor = tensors
+
     def to(self, device: Union[str, int]):
-        """Moves Tensor data to specified device.
-        Will not move data if it has to be reformated anyways but will do that when reformating.
+        """Sets the device batches are moved to.
+        The tensor data stays in host memory, batches are transfered asynchronously when iterating over a data loader.
+        If `keep_on_device` is set, the tensors are copied to the new device once they are needed.
 
         Parameters
         ----------
@@ -304,13 +477,45 @@ class TimeSeriesData(torch.utils.data.Dataset):
 
         """
         self.device = device
-        if self.tensor_prepared:
-            if self.encoder_tensor is not None:
-                self.encoder_tensor.to(device)
-            if self.decoder_tensor is not None:
-                self.decoder_tensor.to(device)
-            if self.target_tensor is not None:
-                self.target_tensor.to(device)
+        if self.keep_on_device:
+            self.tensor_prepared = False
+        return self
+
+    def _on_device(self) -> bool:
+        return (
+            self.keep_on_device
+            and torch.cuda.is_available()
+            and torch.device(self.device).type == "cuda"
+        )
+
+    def _copy_to_device(self):
+        """Starts copying the tensors to the device on a separate stream, see `wait_for_device`."""
+        host_tensors = self._stored_tensors()
+        if self.pin_memory is not False and not all(
+            tensor.is_pinned() for tensor in host_tensors
+        ):
+            self._set_stored_tensors([tensor.pin_memory() for tensor in host_tensors])
+            host_tensors = self._stored_tensors()
+            # the cached tensors are replaced, so they are only page-locked once
+            self._cache_tensors(self._cache_key())
+        self._copy_stream = torch.cuda.Stream(device=self.device)
+        with torch.cuda.stream(self._copy_stream):
+            self._set_stored_tensors(
+                [tensor.to(self.device, non_blocking=True) for tensor in host_tensors]
+            )
+
+    def wait_for_device(self):
+        """Makes the current stream wait until the tensors have been copied to the device.
+        Called by `TensorDataLoader` and when indexing the dataset, before samples are gathered.
+        """
+        if self._copy_stream is None:
+            return self
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_stream(self._copy_stream)
+        for tensor in self._stored_tensors():
+            # memory was allocated on the copy stream but is used on the current one
+            tensor.record_stream(current_stream)
+        self._copy_stream = None
         return self
 
     def make_data_loader(
@@ -323,6 +528,8 @@ class TimeSeriesData(torch.utils.data.Dataset):
         batch_size: int = None,
         shuffle: bool = True,
         drop_last: bool = True,
+        distributed: bool = False,
+        num_workers: int = 0,
     ) -> TensorDataLoader:
         """Creates a DataLoader, which in essence is an iterator over batches of of data.
 
@@ -342,6 +549,12 @@ class TimeSeriesData(torch.utils.data.Dataset):
             Wheter samples and batches are in random order.
         drop_last: bool, default = True
             Wheter to drop data if a batch can not be filled.
+        distributed: bool, default = False
+            Whether to only load a disjoint share of the samples in each process of a distributed training,
+            requires an initialized process group (see `torch.distributed`).
+        num_workers: int, default = 0
+            Number of worker processes that assemble batches. Batches are gathered from the tensors in a single
+            indexing operation, so the main process is usually fast enough.
 
         Returns
         -------
@@ -364,18 +577,50 @@ class TimeSeriesData(torch.utils.data.Dataset):
             batch_size = len(self)
 
         self.to_tensor()
+        if self._on_device():
+            # worker processes can not index tensors on the GPU
+            num_workers = 0
+
+        if distributed:
+            # the sampler shuffles, the order has to be the same in all processes
+            sampling = dict(
+                sampler=torch.utils.data.distributed.DistributedSampler(
+                    self, shuffle=shuffle, drop_last=drop_last
+                ),
+                batch_size=batch_size,
+                drop_last=drop_last,
+            )
+        else:
+            sampling = dict(
+                batch_sampler=PermutationBatchSampler(
+                    len(self),
+                    batch_size=batch_size,
+                    shuffle=shuffle,
+                    drop_last=drop_last,
+                    # batches of tensors kept on the device are gathered with indices on the device
+                    device=self.device if self._on_device() else "cpu",
+                )
+            )
 
+        if num_workers > 0:
+            # prefetch_factor can only be passed together with worker processes
+            sampling.update(persistent_workers=True, prefetch_factor=4)
         return TensorDataLoader(
             self,
-            batch_size=batch_size,
-            shuffle=shuffle,
-            drop_last=drop_last,
+            **sampling,
+            # page-locking is done when packing the batch for the transfer (see `CudaPrefetcher`)
+            pin_memory=False,
+            collate_fn=_collate_batch,
+            num_workers=num_workers,
         )
 
     def to_tensor(
         self,
     ):
         """Creats/updates the torch.Tensor representation of the data if necessary.
+        The preparation steps are applied once to a copy of the dataframe, `self.data` stays unchanged
+        (see `apply_prep_to_frame` to prepare it). Tensors are cached for the last few feature selections,
+        so switching back to a recently used selection does not rebuild them.
 
         Returns
         -------
@@ -386,34 +631,327 @@ class TimeSeriesData(torch.utils.data.Dataset):
             logger.debug("tensor already prepared")
             return self
 
-        if not self.frame_prepared:
-            logger.debug("frame not prepared")
-            df = self.data.copy()
-            df = self._apply_prep_to_frame(self.data, self.preparation_steps)
-        else:
-            df = self.data
+        cache_key = self._cache_key()
+        if cache_key in self._tensor_cache:
+            logger.debug("using cached tensors")
+            (
+                self.encoder_tensor,
+                self.decoder_tensor,
+                self.target_tensor,
+                self.future_tensor,
+                self.encoder_scale,
+                self.decoder_scale,
+            ) = self._tensor_cache[cache_key]
+            self._tensor_cache.move_to_end(cache_key)
+            self.tensor_prepared = True
+            if self._on_device():
+                self._copy_to_device()
+            return self
 
-        self.encoder_tensor = (
-            torch.from_numpy(df.filter(items=self.encoder_features, axis="columns").to_numpy())
-            .float()
-            .to(self.device)
+        if self.frame_prepared or self.preparation_steps is None:
+            df = self.data
+        else:
+            if self._prepared_frame is None:
+                logger.debug("frame not prepared")
+                # the steps are applied to a copy, `self.data` is left unchanged
+                self._prepared_frame = self._apply_prep_to_frame(
+                    self.data.copy(), self.preparation_steps
+                )
+            df = self._prepared_frame
+
+        self.encoder_tensor, self.encoder_scale = self._to_storage(
+            np.ascontiguousarray(
+                df.filter(items=self.encoder_features, axis="columns").to_numpy(),
+                dtype=np.float32,
+            )
         )
-        self.decoder_tensor = (
-            torch.from_numpy(df.filter(items=self.decoder_features, axis="columns").to_numpy())
-            .float()
-            .to(self.device)
+        decoder_values = np.ascontiguousarray(
+            df.filter(items=self.decoder_features, axis="columns").to_numpy(),
+            dtype=np.float32,
         )
-        self.target_tensor = (
-            torch.from_numpy(df.filter(items=self.target_id, axis="columns").to_numpy())
-            .float()
-            .to(self.device)
+        target_values = np.ascontiguousarray(
+            df.filter(items=self.target_id, axis="columns").to_numpy(),
+            dtype=np.float32,
         )
+        if self.dataset_dtype == torch.float32:
+            # decoder features and targets cover the same timesteps, so they are stored and gathered together
+            self.future_tensor = torch.from_numpy(
+                np.concatenate((decoder_values, target_values), axis=1)
+            )
+            self.decoder_tensor, self.target_tensor = self.future_tensor.split(
+                [decoder_values.shape[1], target_values.shape[1]], dim=1
+            )
+            self.decoder_scale = None
+        else:
+            self.future_tensor = None
+            self.decoder_tensor, self.decoder_scale = self._to_storage(decoder_values)
+            self.target_tensor = torch.from_numpy(target_values)
+        self._cache_tensors(cache_key)
         self.tensor_prepared = True
+        if self._on_device():
+            self._copy_to_device()
         return self
 
+    def _cache_tensors(self, cache_key: tuple):
+        # each entry holds a copy of the data, so only a few feature selections are kept
+        self._tensor_cache[cache_key] = self._cache_entry()
+        self._tensor_cache.move_to_end(cache_key)
+        while len(self._tensor_cache) > _TENSOR_CACHE_SIZE:
+            self._tensor_cache.popitem(last=False)
+
+    def _cache_entry(self) -> tuple:
+        return (
+            self.encoder_tensor,
+            self.decoder_tensor,
+            self.target_tensor,
+            self.future_tensor,
+            self.encoder_scale,
+            self.decoder_scale,
+        )
+
+    def _cache_key(self) -> tuple:
+        return (
+            tuple(self.encoder_features),
+            tuple(self.decoder_features),
+            tuple(self.target_id),
+            self.dataset_dtype,
+        )
+
+    def _to_storage(self, values: np.ndarray) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Converts float32 feature values to the storage type, returns the per feature scale if they are quantized."""
+        if self.dataset_dtype != torch.int8:
+            return torch.from_numpy(values).to(self.dataset_dtype), None
+        scale = np.abs(values).max(axis=0, initial=0.0) / 127
+        scale[scale == 0] = 1
+        quantized = np.round(values / scale).astype(np.int8)
+        return torch.from_numpy(quantized), torch.from_numpy(scale.astype(np.float32))
+
+    def dequantize(
+        self, inputs_enc: torch.Tensor, inputs_dec: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Converts quantized encoder and decoder inputs back to float32, other inputs are returned unchanged.
+
+        Parameters
+        ----------
+        inputs_enc: torch.Tensor
+            Encoder inputs of shape (batch, timesteps, features) or (timesteps, features).
+        inputs_dec: torch.Tensor
+            Decoder inputs of shape (batch, timesteps, features) or (timesteps, features).
+
+        Returns
+        -------
+        Tuple[torch.Tensor, torch.Tensor]
+            Encoder and decoder inputs
+        """
+        # the dtype is checked as well, so already converted inputs are not scaled twice
+        if self.encoder_scale is not None and inputs_enc.dtype == torch.int8:
+            inputs_enc = inputs_enc.float() * self.encoder_scale.to(inputs_enc.device)
+        if self.decoder_scale is not None and inputs_dec.dtype == torch.int8:
+            inputs_dec = inputs_dec.float() * self.decoder_scale.to(inputs_dec.device)
+        return inputs_enc, inputs_dec
+
+
+class PermutationBatchSampler(torch.utils.data.Sampler):
+    """Yields the indices of each batch as a tensor, taken from a single permutation of all samples per epoch.
+    This avoids building a list of python integers for every batch. Without shuffling each batch is a slice instead.
+    The batches are views into the permutation, so no per-batch work is done on the host apart from slicing.
+
+    Parameters
+    ----------
+    num_samples: int
+        Number of samples in the dataset.
+    batch_size: int
+        Number of samples per batch.
+    shuffle: bool, default = True
+        Whether the samples are in random order.
+    drop_last: bool, default = True
+        Whether to drop the last batch if it can not be filled.
+    device: Union[int, str], default = "cpu"
+        Device on which the indices are created.
+    """
+
+    def __init__(
+        self,
+        num_samples: int,
+        batch_size: int,
+        shuffle: bool = True,
+        drop_last: bool = True,
+        device: Union[int, str] = "cpu",
+    ):
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.device = device
+        # computed once, a new sampler is made with every data loader
+        if drop_last:
+            self._len = num_samples // batch_size
+            self._stop = self._len * batch_size
+        else:
+            self._len = -(-num_samples // batch_size)
+            self._stop = num_samples
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        stop = self._stop
+        if not self.shuffle:
+            # consecutive samples are fetched as views, see `TimeSeriesData.__getitems__`
+            return (
+                slice(start, min(start + self.batch_size, stop))
+                for start in range(0, stop, self.batch_size)
+            )
+        indices = torch.randperm(self.num_samples, device=self.device)
+        return iter(indices[:stop].split(self.batch_size))
+
+
+def _windows(
+    tensor: torch.Tensor, start: int, num_windows: int, length: int
+) -> torch.Tensor:
+    # consecutive windows overlap, so they are a strided view of shape (windows, length, features),
+    # which is copied so the batch can be modified without changing the stored data
+    window_data = tensor[start : start + num_windows + length - 1]
+    return window_data.unfold(0, length, 1).transpose(1, 2).contiguous()
+
+
+def _gather(tensor: torch.Tensor, positions: torch.Tensor) -> torch.Tensor:
+    # index_select on the flat positions avoids the overhead of advanced indexing
+    return tensor.index_select(0, positions.reshape(-1)).view(
+        *positions.shape, tensor.shape[1]
+    )
+
+
+def _collate_batch(batch):
+    # batches fetched with `TimeSeriesData.__getitems__` are already stacked
+    if isinstance(batch, tuple):
+        return batch
+    return torch.utils.data.dataloader.default_collate(batch)
+
+
+def _pack_batch(
+    batch: Sequence[torch.Tensor], pin_memory: bool = False
+) -> Tuple[list, list]:
+    # copy all tensors of the same dtype into one flat buffer, so they can be transfered at once
+    groups = {}
+    for idx, tensor in enumerate(batch):
+        groups.setdefault(tensor.dtype, []).append(idx)
+    packed = []
+    for dtype, indices in groups.items():
+        buffer = torch.empty(
+            sum(batch[idx].numel() for idx in indices),
+            dtype=dtype,
+            pin_memory=pin_memory,
+        )
+        torch.cat([batch[idx].reshape(-1) for idx in indices], out=buffer)
+        packed.append((buffer, indices))
+    return packed, [tensor.shape for tensor in batch]
+
+
+def _unpack_batch(
+    packed: list, shapes: list, device: Union[int, str]
+) -> Tuple[torch.Tensor, ...]:
+    # one copy per buffer, the tensors are views into the buffer on the device
+    batch = [None] * len(shapes)
+    for buffer, indices in packed:
+        parts = buffer.to(device, non_blocking=True).split(
+            [shapes[idx].numel() for idx in indices]
+        )
+        for idx, part in zip(indices, parts):
+            batch[idx] = part.view(shapes[idx])
+    return tuple(batch)
+
+
+class CudaPrefetcher:
+    """Iterator that copies the next batch to a GPU on a separate CUDA stream,
+    while the current batch is still being processed on the default stream.
+    The tensors of a batch are packed into one page-locked buffer per dtype, so each batch needs only a single transfer
+    for encoder, decoder and target data of the same dtype.
+
+    Parameters
+    ----------
+    loader: Iterable[Tuple[torch.Tensor, ...]]
+        Iterable over batches in host memory.
+    device: Union[int, str]
+        CUDA device the batches are moved to.
+    pin_memory: bool, default = True
+        Whether the buffers are page-locked, otherwise the copies are synchronous.
+    """
+
+    def __init__(
+        self,
+        loader: Iterable[Tuple[torch.Tensor, ...]],
+        device: Union[int, str],
+        pin_memory: bool = True,
+    ):
+        self.device = device
+        self.pin_memory = pin_memory
+        self.loader = iter(loader)
+        self.stream = torch.cuda.Stream(device=device)
+        self._preload()
+
+    def _preload(self):
+        try:
+            batch = next(self.loader)
+        except StopIteration:
+            self.next_batch = None
+            return
+        packed, shapes = _pack_batch(batch, pin_memory=self.pin_memory)
+        with torch.cuda.stream(self.stream):
+            self.next_batch = _unpack_batch(packed, shapes, self.device)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Tuple[torch.Tensor, ...]:
+        if self.next_batch is None:
+            raise StopIteration
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_stream(self.stream)
+        batch = self.next_batch
+        for tensor in batch:
+            # memory was allocated on the copy stream but is used on the current one
+            tensor.record_stream(current_stream)
+        self._preload()
+        return batch
+
 
 class TensorDataLoader(torch.utils.data.dataloader.DataLoader):
-    """torch.DataLoader with an additional `to(device)´ method"""
+    """torch.DataLoader with an additional `to(device)´ method.
+    Batches are moved to the device of the dataset without blocking the host,
+    on CUDA devices the next batch is prefetched on a separate stream (see `CudaPrefetcher`),
+    unless the dataset keeps its tensors on the device. Quantized features are converted back to float32 after they have been moved.
+    """
+
+    def __iter__(self):
+        if hasattr(self.dataset, "wait_for_device"):
+            self.dataset.wait_for_device()
+        batches = super().__iter__()
+        device = getattr(self.dataset, "device", None)
+        if device is None:
+            return batches
+        if (
+            torch.cuda.is_available()
+            and torch.device(device).type == "cuda"
+            and not getattr(self.dataset, "keep_on_device", False)
+        ):
+            batches = CudaPrefetcher(
+                batches,
+                device,
+                pin_memory=getattr(self.dataset, "pin_memory", None) is not False,
+            )
+        else:
+            # does nothing for batches gathered from tensors kept on the device
+            batches = (
+                tuple(tensor.to(device, non_blocking=True) for tensor in batch)
+                for batch in batches
+            )
+        if getattr(self.dataset, "dataset_dtype", None) != torch.int8:
+            return batches
+        return (
+            (*self.dataset.dequantize(inputs_enc, inputs_dec), targets)
+            for inputs_enc, inputs_dec, targets in batches
+        )
 
     def to(self, device):
         """Move underlying dataset to a different device.
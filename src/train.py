@@ -28,20 +28,25 @@ This script scales the data, loads a custom datastructure and then generates and
 
 Notes
 -----
-
+Data parallel training on multiple GPUs can be started with torchrun,
+e.g. `torchrun --nproc_per_node=2 src/train.py -s opsd`.
 """
 
 from functools import partial
+import hashlib
+import json
 import os
+import pickle
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 
 import warnings
-from copy import deepcopy
 
 import pandas as pd
 from sklearn.utils import validation
 import torch
+import torch.distributed as dist
 
 
 MAIN_PATH = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
@@ -63,14 +68,143 @@ from proloaf.event_logging import create_event_logger
 
 torch.set_printoptions(linewidth=120)  # Display option for output
 torch.set_grad_enabled(True)
-torch.manual_seed(1)
 
-warnings.filterwarnings("ignore")
+# only silence library deprecation notices, warnings about slow paths in torch stay visible
+warnings.filterwarnings("ignore", category=DeprecationWarning, module="pandas")
+warnings.filterwarnings("ignore", category=FutureWarning, module="pandas")
+warnings.filterwarnings("ignore", category=FutureWarning, module="sklearn")
+# tensorboard traces the model graph with the deprecated torch.jit.trace
+warnings.filterwarnings("ignore", category=FutureWarning, module="torch.jit")
 
 # create event logger
 logger = create_event_logger("train")
 
 
+def _step_name(step: Callable) -> str:
+    if isinstance(step, partial):
+        return f"{_step_name(step.func)}{step.keywords}"
+    return getattr(step, "__qualname__", type(step).__qualname__)
+
+
+def _prepared_data_cache_path(
+    infile: str, config: dict, work_dir: str, steps: list
+) -> str:
+    """Path of the cached prepared data, the name changes with the input file, every setting that affects preparation
+    and the code of the preparation steps."""
+    stat = os.stat(infile)
+    key = repr(
+        (
+            os.path.abspath(infile),
+            stat.st_mtime_ns,
+            stat.st_size,
+            _preparation_code_hash(),
+            config["feature_groups"],
+            config.get("periodicity", 24),
+            config.get("train_split", 0.7),
+            [_step_name(step) for step in steps],
+        )
+    )
+    return os.path.join(
+        work_dir, ".cache", f"{hashlib.sha1(key.encode()).hexdigest()}.pkl"
+    )
+
+
+def _preparation_code_hash() -> str:
+    # the preparation steps are implemented in the datahandler, changes to it invalidate the cache
+    with open(dh.__file__, "rb") as source_file:
+        return hashlib.sha1(source_file.read()).hexdigest()
+
+
+def _evict_prepared_data_cache(cache_dir: str, keep: int = 4):
+    """Removes all but the `keep` most recently used files of the prepared data cache."""
+    cache_files = sorted(
+        (entry for entry in os.scandir(cache_dir) if entry.name.endswith(".pkl")),
+        key=lambda entry: entry.stat().st_mtime_ns,
+        reverse=True,
+    )
+    for entry in cache_files[keep:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _data_hash(df: pd.DataFrame) -> str:
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()
+    ).hexdigest()
+
+
+def _read_saved_score(model_path: str, data_hash: str) -> float:
+    """Score of the saved model on the validation data, None if it is not known for this data and model file."""
+    try:
+        with open(f"{model_path}.score.json", "r") as score_file:
+            saved = json.load(score_file)
+    except (OSError, ValueError):
+        return None
+    if saved.get("data") != data_hash or saved.get("model_mtime") != os.stat(model_path).st_mtime_ns:
+        return None
+    return saved.get("score")
+
+
+def _write_saved_score(model_path: str, data_hash: str, score: float):
+    with open(f"{model_path}.score.json", "w") as score_file:
+        json.dump(
+            {
+                "data": data_hash,
+                "model_mtime": os.stat(model_path).st_mtime_ns,
+                "score": float(score),
+            },
+            score_file,
+        )
+
+
+def _init_runtime(
+    device: str,
+    seed: int = 1,
+    cudnn_benchmark: bool = False,
+    allow_tf32: bool = False,
+):
+    """Select the device and seed the random number generators before any tensor is allocated.
+
+    Autotuning the cuDNN kernels and TensorFloat-32 tensor cores are faster,
+    but change the results compared to the default settings, so they are only used if requested.
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        if device.index is not None:
+            torch.cuda.set_device(device.index)
+        torch.backends.cudnn.benchmark = cudnn_benchmark
+        torch.backends.cuda.matmul.allow_tf32 = allow_tf32
+        torch.backends.cudnn.allow_tf32 = allow_tf32
+    torch.manual_seed(seed)
+    torch.cuda.manual_seed_all(seed)
+
+
+def _apply_steps(df: pd.DataFrame, steps) -> pd.DataFrame:
+    for step in steps:
+        df = step(df)
+    return df
+
+
+def _prepare_in_parallel(
+    train_df: pd.DataFrame, val_df: pd.DataFrame, train_steps, val_steps, fit_index: int
+):
+    """Prepare training and validation data in two threads.
+
+    The validation data is only scaled once the scaler has been fitted on the training data,
+    which happens in the step at `fit_index`. All other steps of both parts run concurrently.
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        unscaled_val = executor.submit(_apply_steps, val_df, val_steps[:fit_index])
+        train_df = _apply_steps(train_df, train_steps[: fit_index + 1])
+        val_future = executor.submit(
+            lambda: _apply_steps(unscaled_val.result(), val_steps[fit_index:])
+        )
+        train_df = _apply_steps(train_df, train_steps[fit_index + 1 :])
+        return train_df, val_future.result()
+
+
 def main(
     infile: str,
     config: dict,
@@ -79,45 +213,94 @@ def main(
     loss_kwargs: dict = {},
     # log_path: str = None,
     device: str = "cpu",
+    precision: str = None,
 ):
 
+    if precision is None:
+        precision = config.get("precision", "32-true")
+    _init_runtime(
+        device,
+        cudnn_benchmark=config.get("cudnn_benchmark", False),
+        # float32 training keeps full precision unless TensorFloat-32 is requested explicitly
+        allow_tf32=config.get("allow_tf32", precision != "32-true"),
+    )
     logger.info("Current working directory is {:s}".format(work_dir))
 
     # Read load data
-    config = deepcopy(config)
+    # the given config is never modified, changes are merged into a new dict when it is written
     # log_df = log.init_logging(model_name=station_name, work_dir=work_dir, config=config)
     try:
-        df = pd.read_csv(infile, sep=";", index_col=0)
-
-        train_df, val_df = dh.split(df, [config.get("train_split", 0.7)])
-
         scaler = dh.MultiScaler(config["feature_groups"])
-        train_dataset = tl.TimeSeriesData(
-            train_df,
-            device=device,
-            preparation_steps=[
-                dh.set_to_hours,
-                dh.fill_if_missing,
-                dh.add_cyclical_features,
-                dh.add_onehot_features,
-                scaler.fit_transform,
-                dh.check_continuity,
-            ],
-            **config,
-        )
-        val_dataset = tl.TimeSeriesData(
-            val_df,
-            device=device,
-            preparation_steps=[
-                dh.set_to_hours,
-                partial(dh.fill_if_missing, periodicity=config.get("periodicity", 24)),
-                dh.add_cyclical_features,
-                dh.add_onehot_features,
-                scaler.transform,
-                dh.check_continuity,
-            ],
-            **config,
+        train_steps = [
+            dh.set_to_hours,
+            dh.fill_if_missing,
+            dh.add_cyclical_features,
+            dh.add_onehot_features,
+            scaler.fit_transform,
+            dh.check_continuity,
+        ]
+        val_steps = [
+            dh.set_to_hours,
+            partial(dh.fill_if_missing, periodicity=config.get("periodicity", 24)),
+            dh.add_cyclical_features,
+            dh.add_onehot_features,
+            scaler.transform,
+            dh.check_continuity,
+        ]
+        cache_path = None
+        if config.get("cache_prepared_data", False):
+            cache_path = _prepared_data_cache_path(
+                infile, config, work_dir, train_steps + val_steps
+            )
+        if cache_path is not None and os.path.isfile(cache_path):
+            logger.info(f"Loading prepared data from {cache_path}")
+            # the cache is only written by train.py itself, it is not meant for files from other sources
+            with open(cache_path, "rb") as cache_file:
+                train_df, val_df, scaler = pickle.load(cache_file)
+            if not (
+                isinstance(train_df, pd.DataFrame)
+                and isinstance(val_df, pd.DataFrame)
+                and isinstance(scaler, dh.MultiScaler)
+            ):
+                raise RuntimeError(f"{cache_path} does not contain prepared data")
+            # marks the file as recently used for the eviction
+            os.utime(cache_path)
+        else:
+            train_df, val_df = dh.read_csv_split(
+                infile, [config.get("train_split", 0.7)], sep=";", index_col=0
+            )
+            train_df, val_df = _prepare_in_parallel(
+                train_df,
+                val_df,
+                train_steps,
+                val_steps,
+                fit_index=train_steps.index(scaler.fit_transform),
+            )
+            if cache_path is not None:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                # written to a temporary file first, so no incomplete cache is read by concurrent runs
+                temp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(temp_path, "wb") as cache_file:
+                    pickle.dump((train_df, val_df, scaler), cache_file)
+                os.replace(temp_path, cache_path)
+                _evict_prepared_data_cache(os.path.dirname(cache_path))
+
+        # by default reduced precision storage is only used with mixed precision training
+        dataset_dtype = config.get(
+            "dataset_dtype",
+            {"bf16-mixed": "bfloat16", "16-mixed": "float16"}.get(precision, "float32"),
         )
+        if dataset_dtype in ("bfloat16", "float16") and precision == "32-true":
+            raise AttributeError(
+                f"Features stored as {dataset_dtype} can only be used with mixed precision training"
+            )
+        dataset_config = {**config, "dataset_dtype": dataset_dtype}
+        train_dataset = tl.TimeSeriesData(train_df, device=device, **dataset_config)
+        val_dataset = tl.TimeSeriesData(val_df, device=device, **dataset_config)
+        if train_dataset.keep_on_device:
+            # the training data is copied to the device while the validation tensors are built
+            train_dataset.to_tensor()
+            val_dataset.to_tensor()
 
         if config.get("exploration_path") is None:
             tuning_config = None
@@ -135,44 +318,59 @@ def main(
             loss=loss,
             loss_kwargs=loss_kwargs,
             device=device,
+            precision=precision,
         )
 
         modelhandler.fit(
             train_dataset,
             val_dataset,
         )
-        try:
-            ref_model_1 = modelhandler.load_model(
-                os.path.join(
-                    work_dir,
-                    config.get("output_path", ""),
-                    f"{config['model_name']}.pkl",
+        model_path = os.path.join(
+            work_dir, config.get("output_path", ""), f"{config['model_name']}.pkl"
+        )
+        ref_model_1 = None
+        if config.get("compare_against_saved", False):
+            try:
+                ref_model_1 = modelhandler.load_model(model_path)
+            except FileNotFoundError:
+                logger.info(
+                    "No old version of the trained model was found for the new one to compare to"
+                )
+            except Exception as err:
+                logger.warning(
+                    f"An older version of this model was found but could not be loaded, this is likely due to diverignig ProLoaF versions. ({err!r})"
                 )
-            )
-        except FileNotFoundError:
-            ref_model_1 = None
-            logger.info(
-                "No old version of the trained model was found for the new one to compare to"
-            )
-        except Exception:
-            ref_model_1 = None
-            logger.warning(
-                "An older version of this model was found but could not be loaded, this is likely due to diverignig ProLoaF versions."
-            )
         if ref_model_1 is not None:
-            modelhandler.select_model(
-                val_dataset,
-                [ref_model_1, modelhandler.model_wrap],
-                metrics.NllGauss(),
+            data_hash = _data_hash(val_dataset.data)
+            new_model = modelhandler.model_wrap
+            # the validation loss of the training is the same measure, if the model was trained with it
+            new_score = (
+                new_model.last_training.validation_loss
+                if isinstance(new_model.loss_metric, metrics.NllGauss)
+                and new_model.last_training is not None
+                else None
             )
-        modelhandler.save_current_model(
-            os.path.join(
-                work_dir, config.get("output_path", ""), f"{config['model_name']}.pkl"
+            candidates = [ref_model_1, new_model]
+            performances = [_read_saved_score(model_path, data_hash), new_score]
+            if performances[0] is not None:
+                logger.info("Using the stored score of the saved model")
+            for idx, performance in enumerate(performances):
+                if performance is None:
+                    performances[idx] = modelhandler.benchmark(
+                        val_dataset, [candidates[idx]], [metrics.NllGauss()]
+                    ).iloc[0, 0]
+            modelhandler.select_model(
+                val_dataset, candidates, metrics.NllGauss(), performances=performances
             )
-        )
-        config.update(modelhandler.get_config())
+        # in distributed training all processes end up with the same model, only one of them writes it
+        if dist.is_initialized() and dist.get_rank() != 0:
+            return
+        modelhandler.save_current_model(model_path)
+        if ref_model_1 is not None:
+            # the next comparison does not need to evaluate the saved model again
+            _write_saved_score(model_path, data_hash, min(performances))
         ch.write_config(
-            config,
+            {**config, **modelhandler.get_config()},
             model_name=ARGS.station,
             config_path=ARGS.config,
             main_path=work_dir,
@@ -187,18 +385,32 @@ if __name__ == "__main__":
     PAR = read_config(
         model_name=ARGS.station, config_path=ARGS.config, main_path=MAIN_PATH
     )
+    # started with torchrun, each process trains on a share of the data
+    DISTRIBUTED = int(os.environ.get("WORLD_SIZE", 1)) > 1
     if torch.cuda.is_available():
         DEVICE = "cuda"
-        if PAR["cuda_id"] is not None:
-            torch.cuda.set_device(PAR["cuda_id"])
+        if DISTRIBUTED:
+            DEVICE = f"cuda:{int(os.environ.get('LOCAL_RANK', 0))}"
+        elif PAR["cuda_id"] is not None:
+            DEVICE = f"cuda:{PAR['cuda_id']}"
     else:
         DEVICE = "cpu"
 
-    main(
-        infile=os.path.join(MAIN_PATH, PAR["data_path"]),
-        config=PAR,
-        device=DEVICE,
-        work_dir=MAIN_PATH,
-        loss=ARGS.loss,
-        loss_kwargs=LOSS_OPTIONS,
-    )
+    if DISTRIBUTED:
+        # nccl needs the device of this process before the process group is set up
+        _init_runtime(DEVICE)
+        dist.init_process_group(backend="nccl" if DEVICE != "cpu" else "gloo")
+
+    try:
+        main(
+            infile=os.path.join(MAIN_PATH, PAR["data_path"]),
+            config=PAR,
+            device=DEVICE,
+            work_dir=MAIN_PATH,
+            loss=ARGS.loss,
+            loss_kwargs=LOSS_OPTIONS,
+            precision="bf16-mixed" if ARGS.amp else ARGS.precision,
+        )
+    finally:
+        if DISTRIBUTED:
+            dist.destroy_process_group()
@@ -0,0 +1,53 @@
+import os
+import pytest
+from proloaf.confighandler import read_config, write_config
+
+
+@pytest.fixture
+def config():
+    return {"model_name": "test_model", "history_horizon": 24, "target_id": ["load"]}
+
+
+@pytest.fixture
+def config_path(config, tmp_path):
+    path = str(tmp_path / "config.json")
+    write_config(config, config_path=path)
+    return path
+
+
+class TestReadConfig:
+    def test_round_trip(self, config, config_path):
+        assert read_config(config_path=config_path) == config
+
+    def test_returns_copies(self, config, config_path):
+        read_config(config_path=config_path)["target_id"].append("temp")
+        assert read_config(config_path=config_path) == config
+
+    def test_reads_modified_file(self, config, config_path):
+        read_config(config_path=config_path)
+        # the size changes as well, in case the file system has a coarse modification time
+        write_config({**config, "history_horizon": 168}, config_path=config_path)
+        assert read_config(config_path=config_path)["history_horizon"] == 168
+
+
+class TestWriteConfig:
+    def test_unchanged_config_is_not_written(self, config, config_path):
+        os.utime(config_path, ns=(0, 0))
+        write_config(dict(config), config_path=config_path)
+        assert os.stat(config_path).st_mtime_ns == 0
+
+    def test_changed_config_is_written(self, config, config_path):
+        os.utime(config_path, ns=(0, 0))
+        write_config({**config, "history_horizon": 48}, config_path=config_path)
+        assert os.stat(config_path).st_mtime_ns != 0
+        assert read_config(config_path=config_path)["history_horizon"] == 48
+
+    def test_compared_in_serialized_form(self, config, config_path):
+        os.utime(config_path, ns=(0, 0))
+        # tuples are serialized like lists, so the config is the same
+        write_config({**config, "target_id": ("load",)}, config_path=config_path)
+        assert os.stat(config_path).st_mtime_ns == 0
+
+    def test_no_temporary_files_are_left(self, config, config_path, tmp_path):
+        write_config({**config, "history_horizon": 48}, config_path=config_path)
+        assert os.listdir(tmp_path) == ["config.json"]
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from proloaf.loghandler import add_tb_element
+
+
+class RecordingWriter:
+    """Stands in for a SummaryWriter and keeps everything that is logged."""
+
+    def __init__(self):
+        self.scalars = []
+        self.histograms = []
+
+    def add_scalar(self, tag, value, step):
+        self.scalars.append((tag, value, step))
+
+    def add_histogram(self, tag, values, step):
+        self.histograms.append((tag, values, step))
+
+    def add_graph(self, *args, **kwargs):
+        pass
+
+
+def log_epoch(net, writer, **kwargs):
+    return add_tb_element(
+        net=net,
+        tb=writer,
+        epoch_loss=1.0,
+        validation_loss=2.0,
+        training_start=0.0,
+        epoch_stop=2.0,
+        epoch_start=1.0,
+        next_epoch=1,
+        step_counter=10,
+        **kwargs,
+    )
+
+
+class TestAddTbElement:
+    def test_histograms_of_parameters_and_gradients(self):
+        net = torch.nn.Linear(2, 1)
+        net(torch.ones(1, 2)).sum().backward()
+        writer = RecordingWriter()
+        log_epoch(net, writer)
+        assert {tag for tag, _, _ in writer.histograms} == {
+            "weight",
+            "weight.grad",
+            "bias",
+            "bias.grad",
+        }
+
+    def test_skips_histograms(self):
+        writer = RecordingWriter()
+        log_epoch(torch.nn.Linear(2, 1), writer, log_histograms=False)
+        assert len(writer.scalars) == 5
+        assert writer.histograms == []
+
+    def test_background_histograms_use_copies(self):
+        net = torch.nn.Linear(2, 1)
+        expected = net.weight.detach().clone()
+        writer = RecordingWriter()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            log_epoch(net, writer, executor=executor)
+            # training continues while the histograms are written
+            with torch.no_grad():
+                net.weight.add_(1.0)
+        histograms = {tag: values for tag, values, _ in writer.histograms}
+        assert torch.equal(histograms["weight"], expected)
@@ -0,0 +1,94 @@
+import pytest
+import torch
+import proloaf.metrics as metrics
+
+
+@pytest.fixture
+def prediction():
+    torch.manual_seed(1)
+    target = torch.randn(16, 5, 1)
+    median = target.squeeze(dim=2) + 0.1 * torch.randn(16, 5)
+    spread = torch.rand(16, 5) + 0.1
+    values = torch.stack((median - spread, median, median + spread), dim=2)
+    return target, metrics.QuantilePrediction(values, [0.05, 0.5, 0.95])
+
+
+class TestEvaluateMetrics:
+    @pytest.mark.parametrize("avg_over", ["all", "sample", "time"])
+    def test_matches_individual_metrics(self, prediction, avg_over):
+        target, quantile_prediction = prediction
+        selected = [
+            metrics.Residuals(),
+            metrics.Mse(),
+            metrics.Rmse(),
+            metrics.Rae(),
+            metrics.Picp(),
+            metrics.Mape(),
+        ]
+        if avg_over == "all":
+            selected.append(metrics.Mae())
+        values = metrics.evaluate_metrics(
+            target, quantile_prediction, selected, avg_over=avg_over
+        )
+        assert len(values) == len(selected)
+        for metric, value in zip(selected, values):
+            expected = metric.from_quantiles(
+                target=target, quantile_prediction=quantile_prediction, avg_over=avg_over
+            )
+            assert torch.allclose(value, expected, atol=1e-6), metric.id
+
+    def test_no_autograd_graph(self, prediction):
+        target, quantile_prediction = prediction
+        quantile_prediction.values.requires_grad_(True)
+        (value,) = metrics.evaluate_metrics(
+            target, quantile_prediction, [metrics.Mse()]
+        )
+        assert not value.requires_grad
+
+
+class TestMape:
+    def test_hand_computed_value(self):
+        target = torch.tensor([[[2.0], [-4.0], [0.0]]])
+        predictions = torch.tensor([[[1.0], [-5.0], [1e-9]]])
+        # 50 %, 25 % and, with the denominator clamped to eps, 1e-9 / 1e-8 = 10 %
+        expected = (50.0 + 25.0 + 10.0) / 3
+        mape = metrics.Mape()
+        assert mape(target, predictions).item() == pytest.approx(expected, rel=1e-4)
+        assert torch.allclose(
+            mape(target, predictions, avg_over="sample"),
+            torch.tensor([50.0, 25.0, 10.0]),
+            rtol=1e-4,
+        )
+
+    def test_zero_target_is_finite(self):
+        target = torch.zeros(2, 3, 1)
+        predictions = torch.ones(2, 3, 1)
+        assert torch.isfinite(metrics.Mape()(target, predictions))
+        assert torch.isfinite(metrics.Mape(eps=1e-3)(target, predictions))
+
+
+class TestNllGaussKernel:
+    @pytest.mark.skipif(metrics.numba is None, reason="numba is not installed")
+    @pytest.mark.parametrize("dtype", [torch.float32, torch.float64])
+    def test_matches_scripted_nll(self, dtype):
+        torch.manual_seed(1)
+        target, expected_value, log_variance = torch.randn(3, 64, 12, dtype=dtype)
+        kernel = metrics._nll_gauss_elementwise(
+            target.numpy(), expected_value.numpy(), log_variance.numpy()
+        )
+        # the implementations of exp may differ in the last bit
+        assert torch.allclose(
+            torch.from_numpy(kernel),
+            metrics._nll_gauss(target, expected_value, log_variance),
+            rtol=1e-6,
+            atol=1e-7,
+        )
+
+    def test_same_value_with_and_without_gradients(self):
+        torch.manual_seed(1)
+        target = torch.randn(64, 12, 1)
+        predictions = torch.randn(64, 12, 2)
+        with torch.no_grad():
+            evaluated = metrics.NllGauss.func(target, predictions)
+        trained = metrics.NllGauss.func(target, predictions.requires_grad_(True))
+        assert torch.allclose(evaluated, trained.detach(), rtol=1e-6)
@@ -0,0 +1,292 @@
+import contextlib
+import os
+import pytest
+import numpy as np
+import pandas as pd
+import optuna
+import proloaf.datahandler as dh
+import proloaf.tensorloader as tl
+import torch
+from proloaf.modelhandler import ModelHandler, ModelWrapper, TrainingRun
+
+
+@pytest.fixture
+def config():
+    return dict(
+        model_name="test_model",
+        target_id=["load"],
+        encoder_features=["load", "temp"],
+        decoder_features=["temp"],
+        history_horizon=12,
+        forecast_horizon=6,
+        max_epochs=1,
+        exploration=False,
+        batch_size=8,
+        log_path="./logs/",
+        model_class="recurrent",
+        model_parameters={
+            "recurrent": {
+                "core_net": "torch.nn.GRU",
+                "core_layers": 1,
+                "dropout_fc": 0.0,
+                "dropout_core": 0.0,
+                "rel_linear_hidden_size": 1.0,
+                "rel_core_hidden_size": 1.0,
+                "relu_leak": 0.1,
+            }
+        },
+    )
+
+
+@pytest.fixture
+def datasets(config):
+    np.random.seed(1)
+    n = 120
+    df = pd.DataFrame(
+        {
+            "load": np.sin(np.arange(n) * 2 * np.pi / 24),
+            "temp": np.random.randn(n),
+        }
+    )
+    train_df, val_df = dh.split(df, [0.7])
+    return (
+        tl.TimeSeriesData(train_df, **config),
+        tl.TimeSeriesData(val_df, **config),
+    )
+
+
+@pytest.fixture
+def tuning_config(tmp_path):
+    return {
+        "number_of_tests": 3,
+        "storage": "sqlite:///" + os.path.join(tmp_path, "tuning.db"),
+        "study_name": "test_study",
+        "settings": {
+            "learning_rate": {
+                "function": "suggest_float",
+                "kwargs": {"name": "learning_rate", "low": 1e-4, "high": 1e-2},
+            }
+        },
+    }
+
+
+class TestModelHandler:
+    def test_save_load_model(self, config, datasets, tmp_path, monkeypatch):
+        monkeypatch.delenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", raising=False)
+        handler = ModelHandler(config, work_dir=str(tmp_path))
+        handler.fit(*datasets)
+        path = os.path.join(tmp_path, "model.pkl")
+        handler.save_current_model(path)
+        loaded = ModelHandler.load_model(path)
+        assert isinstance(loaded, ModelWrapper)
+        assert loaded.name == handler.model_wrap.name
+
+    def test_tuning_loads_best_model_from_storage(
+        self, config, datasets, tuning_config, tmp_path, monkeypatch
+    ):
+        # trials in a database keep their models as files, which are loaded afterwards
+        monkeypatch.delenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", raising=False)
+        handler = ModelHandler(
+            {**config, "exploration": True},
+            work_dir=str(tmp_path),
+            tuning_config=tuning_config,
+        )
+        handler.tune_hyperparameters(*datasets)
+        study = optuna.load_study(
+            study_name="test_study", storage=tuning_config["storage"]
+        )
+        assert len(study.trials) == 3
+        assert "model_path" in study.best_trial.user_attrs
+        assert isinstance(handler.model_wrap, ModelWrapper)
+        assert handler.config["learning_rate"] == study.best_trial.params["learning_rate"]
+
+    def test_parallel_tuning_runs_number_of_tests(
+        self, config, datasets, tuning_config, tmp_path, monkeypatch
+    ):
+        monkeypatch.delenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", raising=False)
+        handler = ModelHandler(
+            {**config, "exploration": True},
+            work_dir=str(tmp_path),
+            tuning_config={**tuning_config, "n_workers": 2},
+        )
+        handler.tune_hyperparameters(*datasets)
+        study = optuna.load_study(
+            study_name="test_study", storage=tuning_config["storage"]
+        )
+        assert len(study.trials) == 3
+        assert isinstance(handler.model_wrap, ModelWrapper)
+
+
+class TestTrainingRun:
+    def test_empty_loaders_give_zero_loss(self, datasets):
+        run = TrainingRun(
+            torch.nn.Linear(1, 1),
+            torch.nn.functional.mse_loss,
+            *datasets,
+            batch_size=8,
+            compile_model=False,
+            log_graph=False,
+        )
+        run.train_dl = []
+        run.validation_dl = []
+        run.step().validate()
+        assert run.training_loss == 0.0
+        assert run.validation_loss == 0.0
+
+    def test_compile_is_opt_in(self, datasets):
+        run = TrainingRun(
+            torch.nn.Linear(1, 1), torch.nn.functional.mse_loss, *datasets
+        )
+        assert not run.compile_model
+        # only compiled for training on CUDA devices
+        run.compile_model = True
+        assert not run._use_compile()
+
+
+class _DecoderLinear(torch.nn.Module):
+    """Minimal forecasting model with the interface expected by TrainingRun."""
+
+    def __init__(self, n_features):
+        super().__init__()
+        self.linear = torch.nn.Linear(n_features, 1)
+
+    def forward(self, inputs_enc, inputs_dec):
+        return self.linear(inputs_dec), None
+
+
+def _make_run(datasets, **kwargs):
+    torch.manual_seed(1)
+    return TrainingRun(
+        _DecoderLinear(1),
+        torch.nn.functional.mse_loss,
+        *datasets,
+        batch_size=8,
+        history_horizon=12,
+        forecast_horizon=6,
+        max_epochs=1,
+        learning_rate=1e-2,
+        log_graph=False,
+        **kwargs,
+    )
+
+
+class _Stream:
+    def wait_stream(self, stream):
+        pass
+
+
+class TestPrecision:
+    @pytest.mark.parametrize(
+        "precision, scaled", [("32-true", False), ("bf16-mixed", False), ("16-mixed", True)]
+    )
+    def test_grad_scaler_only_for_float16(self, datasets, precision, scaled):
+        run = _make_run(datasets, precision=precision)
+        assert (run._grad_scaler is not None) == scaled
+
+    def test_unknown_precision(self, datasets):
+        with pytest.raises(AttributeError):
+            _make_run(datasets, precision="8-true")
+
+    def test_float16_training_with_loss_scaling(self, datasets):
+        run = _make_run(datasets, precision="16-mixed")
+        params = [param.detach().clone() for param in run.model.parameters()]
+        run.train()
+        assert np.isfinite(run.training_loss)
+        assert np.isfinite(run.validation_loss)
+        assert run._grad_scaler.get_scale() > 0
+        # the weights stay in float32 and are updated
+        for param, before in zip(run.model.parameters(), params):
+            assert param.dtype == torch.float32
+            assert not torch.equal(param, before)
+
+
+class TestCompile:
+    def test_failed_compile_falls_back_to_eager(self, datasets, monkeypatch):
+        run = _make_run(datasets, compile_model=True)
+        run._train_model = run.model
+        batch = next(iter(datasets[0].make_data_loader(batch_size=8)))
+
+        def failing_compile(*args, **kwargs):
+            raise RuntimeError("compilation failed")
+
+        monkeypatch.setattr(run, "_use_compile", lambda: True)
+        monkeypatch.setattr(torch, "compile", failing_compile)
+        assert run._compile(*batch[:2]) is run.model
+
+
+class TestCudaGraph:
+    def test_failed_capture_restores_state(self, datasets, monkeypatch):
+        run = _make_run(datasets)
+        batch = next(iter(datasets[0].make_data_loader(batch_size=8)))
+        params = [param.detach().clone() for param in run.model.parameters()]
+
+        def failing_capture(graph):
+            raise RuntimeError("capture failed")
+
+        # the warmup runs real optimization steps on the cpu, the capture fails
+        monkeypatch.setattr(torch.cuda, "Stream", _Stream)
+        monkeypatch.setattr(torch.cuda, "current_stream", lambda *args: _Stream())
+        monkeypatch.setattr(torch.cuda, "stream", lambda stream: contextlib.nullcontext())
+        monkeypatch.setattr(torch.cuda, "CUDAGraph", object)
+        monkeypatch.setattr(torch.cuda, "graph", failing_capture)
+        run._capture_graph(*batch)
+
+        assert run._graph is None
+        assert run._static_batch is None
+        for param, saved in zip(run.model.parameters(), params):
+            assert torch.equal(param, saved)
+            assert param.grad is None
+        # the optimizer is initialized again by the next eager step
+        assert len(run.optimizer.state) == 0
+
+    def test_restore_keeps_zeroed_new_state(self, datasets):
+        run = _make_run(datasets)
+        batch = next(iter(datasets[0].make_data_loader(batch_size=8)))
+        params = [param.detach().clone() for param in run.model.parameters()]
+        state = {param: dict(value) for param, value in run.optimizer.state.items()}
+        run._optimization_step(*batch)
+        run._restore_state(params, state)
+        for param, saved in zip(run.model.parameters(), params):
+            assert torch.equal(param, saved)
+            param_state = run.optimizer.state[param]
+            assert torch.count_nonzero(param_state["exp_avg"]) == 0
+            assert float(param_state["step"]) == 0
+
+    @pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a CUDA device")
+    def test_graph_replay_matches_eager(self, datasets):
+        runs = [
+            _make_run(datasets, device="cuda", cuda_graph=cuda_graph).to("cuda")
+            for cuda_graph in (False, True)
+        ]
+        captured = []
+        capture = runs[1]._capture_graph
+
+        def record_capture(*batch):
+            capture(*batch)
+            captured.append(runs[1]._graph is not None)
+            return runs[1]
+
+        runs[1]._capture_graph = record_capture
+        for run in runs:
+            run.train()
+        assert captured == [True]
+        for eager, replayed in zip(runs[0].model.parameters(), runs[1].model.parameters()):
+            assert torch.allclose(eager, replayed, atol=1e-6)
+
+
+class TestTuningStudies:
+    def test_unnamed_studies_are_not_resumed(
+        self, config, datasets, tuning_config, tmp_path, monkeypatch
+    ):
+        monkeypatch.delenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", raising=False)
+        tuning_config = {**tuning_config, "number_of_tests": 1}
+        del tuning_config["study_name"]
+        for _ in range(2):
+            ModelHandler(
+                {**config, "exploration": True},
+                work_dir=str(tmp_path),
+                tuning_config=tuning_config,
+            ).tune_hyperparameters(*datasets)
+        summaries = optuna.get_all_study_summaries(storage=tuning_config["storage"])
+        assert len(summaries) == 2
+        assert all(summary.n_trials == 1 for summary in summaries)
@@ -0,0 +1,33 @@
+import pytest
+import numpy as np
+import pandas as pd
+from proloaf.datahandler import read_csv_split, split
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    np.random.seed(1)
+    cols = ["target", "feat1", "feat2", "feat3"]
+    df = pd.DataFrame(np.random.randn(10, len(cols)), columns=cols)
+    df["count"] = np.arange(10)
+    path = tmp_path / "data.csv"
+    df.to_csv(path, sep=";")
+    return path
+
+
+class TestReadCsvSplit:
+    @pytest.mark.parametrize("chunksize", [3, 7, 1000])
+    def test_same_as_read_and_split(self, csv_path, chunksize):
+        parts = read_csv_split(str(csv_path), [0.6, 0.8], chunksize=chunksize)
+        df = pd.read_csv(csv_path, sep=";", index_col=0)
+        float_columns = df.select_dtypes(include="floating").columns
+        expected = split(
+            df.astype({col: np.float32 for col in float_columns}), [0.6, 0.8]
+        )
+        assert len(parts) == len(expected)
+        for part, exp in zip(parts, expected):
+            pd.testing.assert_frame_equal(part, exp)
+
+    def test_keeps_float64(self, csv_path):
+        (part,) = read_csv_split(str(csv_path), [], float_dtype=None)
+        pd.testing.assert_frame_equal(part, pd.read_csv(csv_path, sep=";", index_col=0))
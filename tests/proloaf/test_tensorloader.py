@@ -0,0 +1,173 @@
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+import proloaf.tensorloader as tl
+from proloaf.tensorloader import TimeSeriesData, PermutationBatchSampler
+
+
+@pytest.fixture
+def dataframe():
+    np.random.seed(1)
+    return pd.DataFrame(
+        {
+            "target": np.random.randn(50),
+            "feat1": 10 * np.random.randn(50),
+            "feat2": np.zeros(50),
+        }
+    )
+
+
+def make_data(df, **kwargs):
+    return TimeSeriesData(
+        df,
+        history_horizon=6,
+        forecast_horizon=3,
+        encoder_features=["target", "feat1"],
+        decoder_features=["feat1", "feat2"],
+        target_id=["target"],
+        **kwargs,
+    ).to_tensor()
+
+
+class TestQuantization:
+    def test_round_trip(self, dataframe):
+        data = make_data(dataframe, dataset_dtype="int8")
+        assert data.encoder_tensor.dtype == torch.int8
+        inputs_enc, inputs_dec = data.dequantize(
+            data.encoder_tensor, data.decoder_tensor
+        )
+        # rounding to the nearest step is off by at most half a step
+        enc_values = dataframe[["target", "feat1"]].to_numpy(dtype=np.float32)
+        dec_values = dataframe[["feat1", "feat2"]].to_numpy(dtype=np.float32)
+        assert (
+            np.abs(inputs_enc.numpy() - enc_values)
+            <= data.encoder_scale.numpy() / 2 + 1e-6
+        ).all()
+        assert (
+            np.abs(inputs_dec.numpy() - dec_values)
+            <= data.decoder_scale.numpy() / 2 + 1e-6
+        ).all()
+        # constant zero features are kept exactly
+        assert (inputs_dec[:, 1] == 0).all()
+
+    def test_dequantize_is_idempotent(self, dataframe):
+        data = make_data(dataframe, dataset_dtype="int8")
+        once = data.dequantize(data.encoder_tensor, data.decoder_tensor)
+        twice = data.dequantize(*once)
+        assert all(torch.equal(a, b) for a, b in zip(once, twice))
+
+    def test_getitem_returns_dequantized_floats(self, dataframe):
+        data = make_data(dataframe, dataset_dtype="int8")
+        reference = make_data(dataframe)
+        for quantized, exact in zip(data[4], reference[4]):
+            assert quantized.dtype == torch.float32
+            assert torch.allclose(quantized, exact, atol=0.1)
+
+    def test_loader_returns_dequantized_floats(self, dataframe):
+        data = make_data(dataframe, dataset_dtype="int8")
+        reference = make_data(dataframe)
+        batch = next(iter(data.make_data_loader(batch_size=8, shuffle=False)))
+        reference_batch = next(
+            iter(reference.make_data_loader(batch_size=8, shuffle=False))
+        )
+        for quantized, exact in zip(batch, reference_batch):
+            assert quantized.dtype == torch.float32
+            assert torch.allclose(quantized, exact, atol=0.1)
+
+
+class TestPreparation:
+    def test_to_tensor_keeps_data_unprepared(self, dataframe):
+        data = TimeSeriesData(
+            dataframe.copy(),
+            history_horizon=6,
+            forecast_horizon=3,
+            encoder_features=["target"],
+            decoder_features=["feat1"],
+            target_id=["target"],
+            preparation_steps=[lambda df: df * 2],
+        )
+        data.to_tensor()
+        pd.testing.assert_frame_equal(data.data, dataframe)
+        assert torch.allclose(
+            data.encoder_tensor[:, 0],
+            torch.as_tensor(2 * dataframe["target"].to_numpy(), dtype=torch.float32),
+        )
+        # a different feature selection reuses the prepared frame instead of preparing it again
+        data.encoder_features = ["feat1"]
+        data.to_tensor()
+        pd.testing.assert_frame_equal(data.data, dataframe)
+        assert torch.allclose(
+            data.encoder_tensor[:, 0],
+            torch.as_tensor(2 * dataframe["feat1"].to_numpy(), dtype=torch.float32),
+        )
+
+
+class TestBatches:
+    @pytest.mark.parametrize("shuffle", [False, True])
+    def test_batches_are_copies(self, dataframe, shuffle):
+        data = make_data(dataframe)
+        stored = [tensor.clone() for tensor in data._stored_tensors()]
+        for inputs_enc, inputs_dec, targets in data.make_data_loader(
+            batch_size=8, shuffle=shuffle
+        ):
+            assert inputs_enc.is_contiguous()
+            inputs_enc.zero_()
+            inputs_dec.zero_()
+            targets.zero_()
+        for before, after in zip(stored, data._stored_tensors()):
+            assert torch.equal(before, after)
+
+    def test_consecutive_batch_matches_samples(self, dataframe):
+        data = make_data(dataframe)
+        batch = data.__getitems__(slice(2, 10))
+        for i, sample in enumerate(range(2, 10)):
+            for batched, single in zip(batch, data[sample]):
+                assert torch.equal(batched[i], single)
+
+
+class TestPermutationBatchSampler:
+    @pytest.mark.parametrize("shuffle", [False, True])
+    @pytest.mark.parametrize("drop_last", [False, True])
+    def test_covers_samples(self, shuffle, drop_last):
+        sampler = PermutationBatchSampler(
+            num_samples=23, batch_size=5, shuffle=shuffle, drop_last=drop_last
+        )
+        batches = list(sampler)
+        assert len(batches) == len(sampler) == (4 if drop_last else 5)
+        indices = torch.cat(
+            [
+                torch.arange(batch.start, batch.stop)
+                if isinstance(batch, slice)
+                else batch
+                for batch in batches
+            ]
+        )
+        assert len(indices) == (20 if drop_last else 23)
+        assert len(indices.unique()) == len(indices)
+        assert ((indices >= 0) & (indices < 23)).all()
+
+    def test_consecutive_batches_are_slices(self):
+        sampler = PermutationBatchSampler(num_samples=10, batch_size=4, shuffle=False)
+        assert list(sampler) == [slice(0, 4), slice(4, 8)]
+
+
+class TestTensorCache:
+    def test_reuses_recent_selections(self, dataframe):
+        data = make_data(dataframe)
+        encoder_tensor = data.encoder_tensor
+        data.encoder_features = ["feat1"]
+        data.to_tensor()
+        data.encoder_features = ["target", "feat1"]
+        data.to_tensor()
+        assert data.encoder_tensor is encoder_tensor
+
+    def test_is_bounded(self, dataframe):
+        data = make_data(dataframe)
+        selections = [["target"], ["feat1"], ["feat2"], ["target", "feat2"], ["feat1", "feat2"]]
+        for features in selections:
+            data.encoder_features = features
+            data.to_tensor()
+        assert len(data._tensor_cache) == tl._TENSOR_CACHE_SIZE
+        # the least recently used selection was dropped
+        assert ("target", "feat1") not in [key[0] for key in data._tensor_cache]
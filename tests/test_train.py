@@ -0,0 +1,74 @@
+import os
+import sys
+import pandas as pd
+import pytest
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import train
+
+
+@pytest.fixture
+def cuda_backends():
+    settings = (
+        torch.backends.cudnn.benchmark,
+        torch.backends.cuda.matmul.allow_tf32,
+        torch.backends.cudnn.allow_tf32,
+    )
+    yield
+    (
+        torch.backends.cudnn.benchmark,
+        torch.backends.cuda.matmul.allow_tf32,
+        torch.backends.cudnn.allow_tf32,
+    ) = settings
+
+
+class TestInitRuntime:
+    def test_seeds_generators(self):
+        train._init_runtime("cpu", seed=3)
+        first = torch.rand(3)
+        train._init_runtime("cpu", seed=3)
+        assert torch.equal(first, torch.rand(3))
+
+    @pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a CUDA device")
+    def test_tf32_and_benchmark_are_opt_in(self, cuda_backends):
+        train._init_runtime("cuda")
+        assert not torch.backends.cudnn.benchmark
+        assert not torch.backends.cuda.matmul.allow_tf32
+        assert not torch.backends.cudnn.allow_tf32
+        train._init_runtime("cuda", cudnn_benchmark=True, allow_tf32=True)
+        assert torch.backends.cudnn.benchmark
+        assert torch.backends.cuda.matmul.allow_tf32
+        assert torch.backends.cudnn.allow_tf32
+
+
+@pytest.fixture
+def saved_model(tmp_path):
+    model_path = str(tmp_path / "model.pkl")
+    with open(model_path, "wb") as model_file:
+        model_file.write(b"model")
+    return model_path
+
+
+class TestSavedScore:
+    data = pd.DataFrame({"load": [1.0, 2.0, 3.0]})
+
+    def test_round_trip(self, saved_model):
+        data_hash = train._data_hash(self.data)
+        train._write_saved_score(saved_model, data_hash, 0.25)
+        assert train._read_saved_score(saved_model, data_hash) == 0.25
+
+    def test_missing_score(self, saved_model):
+        assert train._read_saved_score(saved_model, train._data_hash(self.data)) is None
+
+    def test_other_data(self, saved_model):
+        train._write_saved_score(saved_model, train._data_hash(self.data), 0.25)
+        other_data = self.data.assign(load=[1.0, 2.0, 4.0])
+        assert train._read_saved_score(saved_model, train._data_hash(other_data)) is None
+
+    def test_replaced_model(self, saved_model):
+        data_hash = train._data_hash(self.data)
+        train._write_saved_score(saved_model, data_hash, 0.25)
+        mtime = os.stat(saved_model).st_mtime_ns
+        os.utime(saved_model, ns=(mtime + 10**9, mtime + 10**9))
+        assert train._read_saved_score(saved_model, data_hash) is None